@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_caches(django_test_environment):
+    """Под pytest общий кеш тоже лежит во временном каталоге."""
+    from core.test_runner import temporary_caches
+
+    with temporary_caches():
+        yield
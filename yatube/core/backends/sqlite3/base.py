@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+from core.sqlite import apply_pragmas
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite-бэкенд Django с настройкой соединений.
+
+    На каждом новом соединении выполняются SQLITE_PRAGMAS, поверх них —
+    OPTIONS['pragmas'] (например, query_only у реплик; None убирает
+    PRAGMA из SQLITE_PRAGMAS). Транзакции
+    atomic открываются как BEGIN <OPTIONS['transaction_mode']>: при
+    IMMEDIATE блокировка записи берётся сразу и ждёт busy_timeout.
+    С DEFERRED транзакция, которая сначала читает, а потом пишет, в WAL
+    падает с «database is locked» сразу, если другой писатель успел
+    закоммитить, — busy_timeout ей не помогает.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('transaction_mode', None)
+        params.pop('pragmas', None)
+        return params
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}')
+        return mode
+
+    @property
+    def pragmas(self):
+        pragmas = {
+            **settings.SQLITE_PRAGMAS,
+            **self.settings_dict['OPTIONS'].get('pragmas', {}),
+        }
+        return {
+            name: value for name, value in pragmas.items()
+            if value is not None
+        }
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,102 @@
+import gzip
+import shutil
+import sqlite3
+import time
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupRestarted(Exception):
+    """Копирование начиналось заново слишком много раз."""
+
+
+class BackupFailed(Exception):
+    """Копия не прошла проверку целостности."""
+
+
+class BackupStats:
+    """Как шло копирование: шаги, перезапуски и время под блокировкой.
+
+    В WAL источник держит одну транзакцию чтения (снимок) на всё
+    копирование: писатели не ждут, копия согласована и не начинается
+    заново. snapshot — сколько держался снимок. В остальных режимах
+    каждый шаг берёт SHARED-блокировку, которая не пускает писателей:
+    locked и max_step — суммарное и самое долгое её время.
+    """
+
+    def __init__(self):
+        self.journal_mode = None
+        self.pages = 0
+        self.steps = 0
+        self.restarts = 0
+        self.seconds = 0
+        self.snapshot = 0
+        self.locked = 0
+        self.max_step = 0
+        self.remaining = None
+        self.resumed = None
+
+
+def backup(source_path, target_path, pages, pause, max_restarts):
+    """Копирует базу source_path в файл target_path через backup API
+    шагами по pages страниц с паузой pause секунд между шагами."""
+    stats = BackupStats()
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path, isolation_level=None)
+    started = time.monotonic()
+    stats.journal_mode = source.execute('PRAGMA journal_mode').fetchone()[0]
+    wal = stats.journal_mode == 'wal'
+
+    def progress(status, remaining, total):
+        now = time.monotonic()
+        step = now - stats.resumed
+        stats.steps += 1
+        stats.pages = total
+        if not wal:
+            stats.locked += step
+            stats.max_step = max(stats.max_step, step)
+        if stats.remaining is not None and remaining > stats.remaining:
+            stats.restarts += 1
+            if stats.restarts > max_restarts:
+                raise BackupRestarted(
+                    f'База менялась во время копирования, перезапусков: '
+                    f'{stats.restarts}')
+        stats.remaining = remaining
+        if remaining:
+            time.sleep(pause)
+        stats.resumed = time.monotonic()
+
+    try:
+        if wal:
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        stats.resumed = time.monotonic()
+        source.backup(target, pages=pages, progress=progress)
+        if wal:
+            source.execute('COMMIT')
+            stats.snapshot = time.monotonic() - started
+        target.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        source.close()
+        target.close()
+    stats.seconds = time.monotonic() - started
+    return stats
+
+
+def verify(path, quick=False):
+    """PRAGMA integrity_check (или quick_check) копии."""
+    connection = sqlite3.connect(path)
+    try:
+        check = 'quick_check' if quick else 'integrity_check'
+        result = [row[0] for row in connection.execute(f'PRAGMA {check}')]
+    finally:
+        connection.close()
+    if result != ['ok']:
+        raise BackupFailed('; '.join(result[:10]))
+
+
+def compress(path, output):
+    """Сжимает файл gzip-потоком в открытый двоичный файл output."""
+    with open(path, 'rb') as source, gzip.GzipFile(
+            fileobj=output, mode='wb') as target:
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
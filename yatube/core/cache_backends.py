@@ -0,0 +1,311 @@
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE TABLE IF NOT EXISTS changes ('
+    ' stamp INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, changed REAL)',
+)
+
+
+class LRU:
+    """Ограниченный по числу записей LRU в памяти."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires):
+        self.entries[key] = (value, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def delete(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    """Кеш из двух уровней: LRU в памяти (L1) и общий для всех
+    процессов SQLite-файл (L2).
+
+    L1 и статистика принадлежат объекту кеша, а Django 2.2 создаёт его
+    в каждом потоке, так что у каждого потока свой L1. Каждая запись,
+    удаление и touch в L2 добавляет строку в журнал changes с растущим
+    stamp. Раз в SYNC_INTERVAL секунд объект читает журнал после
+    последнего виденного stamp и выбрасывает эти ключи из L1, так что
+    чужие изменения доходят до него не позже этого интервала.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.sync_interval = options.get('SYNC_INTERVAL', 1)
+        self.changes_ttl = options.get('CHANGES_TTL', 60 * 60)
+        self.cull_probability = options.get('CULL_PROBABILITY', 0.01)
+        self.l1 = LRU(options.get('L1_MAX_ENTRIES', 1000))
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.stamp = None
+        self.synced = 0
+        self.hits = {'l1': 0, 'l2': 0}
+        self.misses = {'l1': 0, 'l2': 0}
+
+    @property
+    def db(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def stats(self):
+        """Попадания и промахи по уровням у этого объекта кеша (потока)."""
+        return {'hits': dict(self.hits), 'misses': dict(self.misses)}
+
+    def sync(self, force=False):
+        """Выбрасывает из L1 ключи, изменённые другими потоками и
+        процессами."""
+        now = time.time()
+        if not force and now - self.synced < self.sync_interval:
+            return
+        with self.lock:
+            if self.stamp is None:
+                rows = []
+                self.stamp = self.db.execute(
+                    'SELECT COALESCE(MAX(stamp), 0) FROM changes'
+                ).fetchone()[0]
+            else:
+                rows = self.db.execute(
+                    'SELECT stamp, key FROM changes WHERE stamp > ?',
+                    (self.stamp,)).fetchall()
+            for stamp, key in rows:
+                self.stamp = max(self.stamp, stamp)
+                if key is None:
+                    self.l1.clear()
+                else:
+                    self.l1.delete(key)
+            self.synced = now
+
+    def log_change(self, keys):
+        now = time.time()
+        self.db.executemany(
+            'INSERT INTO changes (key, changed) VALUES (?, ?)',
+            [(key, now) for key in keys])
+        if random.random() < self.cull_probability:
+            self.db.execute(
+                'DELETE FROM entries WHERE expires <= ?', (now,))
+            self.db.execute(
+                'DELETE FROM changes WHERE changed < ?',
+                (now - self.changes_ttl,))
+
+    def write(self, rows):
+        """Пишет строки (key, value, expires) в L2 и журнал, затем в L1."""
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT OR REPLACE INTO entries (key, value, expires) '
+                'VALUES (?, ?, ?)', rows)
+            self.log_change(key for key, _, _ in rows)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        with self.lock:
+            for key, value, expires in rows:
+                self.l1.set(key, value, expires)
+
+    def read(self, keys):
+        """Значения ключей: сначала L1, промахи одним запросом в L2."""
+        self.sync()
+        found, missing = {}, []
+        with self.lock:
+            for key in keys:
+                value = self.l1.get(key)
+                if value is None:
+                    missing.append(key)
+                else:
+                    found[key] = value
+        self.hits['l1'] += len(found)
+        self.misses['l1'] += len(missing)
+        rows = []
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows += self.db.execute(
+                'SELECT key, value, expires FROM entries '
+                'WHERE key IN ({}) AND (expires IS NULL OR expires > ?)'
+                .format(', '.join('?' * len(chunk))),
+                (*chunk, time.time())).fetchall()
+        if missing:
+            with self.lock:
+                for key, value, expires in rows:
+                    self.l1.set(key, value, expires)
+                    found[key] = value
+            self.hits['l2'] += len(rows)
+            self.misses['l2'] += len(missing) - len(rows)
+        return {key: pickle.loads(value) for key, value in found.items()}
+
+    def make_entry(self, key, value, timeout, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self.get_backend_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        return {
+            made[key]: value for key, value in self.read(list(made)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.write([self.make_entry(key, value, timeout, version)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if data:
+            self.write([
+                self.make_entry(key, value, timeout, version)
+                for key, value in data.items()
+            ])
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, value, expires = self.make_entry(key, value, timeout, version)
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM entries WHERE key = ? AND expires <= ?',
+                (key, time.time()))
+            added = db.execute(
+                'INSERT OR IGNORE INTO entries (key, value, expires) '
+                'VALUES (?, ?, ?)', (key, value, expires)).rowcount == 1
+            if added:
+                self.log_change([key])
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        if added:
+            with self.lock:
+                self.l1.set(key, value, expires)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM entries WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.dumps(
+                pickle.loads(row[0]) + delta, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE entries SET value = ? WHERE key = ?', (value, key))
+            self.log_change([key])
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        with self.lock:
+            self.l1.set(key, value, row[1])
+        return pickle.loads(value)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            touched = db.execute(
+                'UPDATE entries SET expires = ? WHERE key = ?',
+                (self.get_backend_timeout(timeout), key)).rowcount == 1
+            if touched:
+                self.log_change([key])
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        with self.lock:
+            self.l1.delete(key)
+        return touched
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'DELETE FROM entries WHERE key = ?', [(k,) for k in keys])
+            self.log_change(keys)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        with self.lock:
+            for key in keys:
+                self.l1.delete(key)
+
+    def clear(self):
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM entries')
+            self.log_change([None])
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        with self.lock:
+            self.l1.clear()
+
+    def close(self, **kwargs):
+        pass
@@ -0,0 +1,112 @@
+import time
+
+from django.db import DatabaseError
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def pragma(cursor, name):
+    cursor.execute(f'PRAGMA {name}')
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def analyze(cursor, tables, limit, deadline):
+    """ANALYZE таблиц по одной, пока не вышло время, затем PRAGMA
+    optimize. analysis_limit ограничивает число строк индекса, которые
+    читает ANALYZE: статистика приблизительная, зато шаг короткий на
+    таблице любого размера. Возвращает проанализированные таблицы."""
+    cursor.execute(f'PRAGMA analysis_limit = {int(limit)}')
+    done = []
+    for table in tables:
+        if time.monotonic() >= deadline:
+            break
+        cursor.execute(f'ANALYZE {quote(table)}')
+        done.append(table)
+    cursor.execute('PRAGMA optimize')
+    return done
+
+
+def incremental_vacuum(cursor, pages, deadline, pause=0):
+    """Возвращает свободные страницы файлу шагами по pages страниц.
+
+    Каждый шаг — своя короткая транзакция, между шагами пауза pause
+    секунд, чтобы писатели сайта не ждали. Работает только при
+    auto_vacuum = INCREMENTAL. Возвращает число освобождённых страниц.
+    """
+    if pragma(cursor, 'auto_vacuum') != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    freed = 0
+    while time.monotonic() < deadline:
+        before = pragma(cursor, 'freelist_count')
+        if not before:
+            break
+        cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+        cursor.fetchall()
+        freed += before - pragma(cursor, 'freelist_count')
+        time.sleep(pause)
+    return freed
+
+
+def object_sizes(cursor, name):
+    """(байт, неиспользуемых байт) объекта по dbstat или None, если
+    SQLite собран без dbstat."""
+    try:
+        cursor.execute(
+            'SELECT sum(pgsize), sum(unused) FROM dbstat WHERE name = %s',
+            [name])
+    except DatabaseError:
+        return None
+    size, unused = cursor.fetchone()
+    return size or 0, unused or 0
+
+
+def estimated_rows(cursor, table):
+    """Число строк из sqlite_stat1, без COUNT(*) по таблице."""
+    try:
+        cursor.execute(
+            'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+    except DatabaseError:
+        return None
+    row = cursor.fetchone()
+    return int(row[0].split()[0]) if row else None
+
+
+def report(cursor, tables):
+    """Состояние файла базы и таблиц tables.
+
+    fragmentation — доля неиспользуемых байт в страницах таблицы и её
+    индексов.
+    """
+    result = {
+        'page_size': pragma(cursor, 'page_size'),
+        'page_count': pragma(cursor, 'page_count'),
+        'freelist_count': pragma(cursor, 'freelist_count'),
+        'auto_vacuum': pragma(cursor, 'auto_vacuum'),
+        'tables': [],
+    }
+    for table in tables:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND tbl_name = %s ORDER BY name", [table])
+        index_names = [row[0] for row in cursor.fetchall()]
+        sizes = object_sizes(cursor, table)
+        indexes = {name: object_sizes(cursor, name) for name in index_names}
+        entry = {
+            'table': table,
+            'rows': estimated_rows(cursor, table),
+            'bytes': sizes and sizes[0],
+            'indexes': {
+                name: size and size[0] for name, size in indexes.items()},
+            'fragmentation': None,
+        }
+        if sizes is not None:
+            total = sizes[0] + sum(size[0] for size in indexes.values())
+            unused = sizes[1] + sum(size[1] for size in indexes.values())
+            entry['fragmentation'] = round(unused / total, 3) if total else 0
+        result['tables'].append(entry)
+    return result
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas
+
+SCHEMA = '''
+    CREATE TABLE post (
+        id INTEGER PRIMARY KEY, author INTEGER, text TEXT, pub_date REAL);
+    CREATE INDEX post_author ON post (author, pub_date);
+    CREATE TABLE counter (author INTEGER PRIMARY KEY, posts INTEGER);
+'''
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения и записи SQLite с '
+            'PRAGMA и транзакциями по умолчанию и с SQLITE_PRAGMAS и '
+            'transaction_mode из DATABASES. Нагрузка похожа на '
+            'ленты и post_create: читатели выбирают страницу постов '
+            'автора, писатели в транзакции читают счётчик и добавляют '
+            'пост. База создаётся во временном каталоге.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--authors', type=int, default=100)
+
+    def seed(self, path, options):
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA)
+        connection.executemany(
+            'INSERT INTO post (author, text, pub_date) VALUES (?, ?, ?)',
+            ((i % options['authors'], f'Пост {i}', i)
+             for i in range(options['rows'])))
+        connection.executemany(
+            'INSERT INTO counter VALUES (?, 0)',
+            ((i,) for i in range(options['authors'])))
+        connection.commit()
+        connection.close()
+
+    def connect(self, path, pragmas):
+        # Как у Django: таймаут модуля sqlite3 по умолчанию и явные
+        # транзакции.
+        connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False)
+        apply_pragmas(connection, pragmas)
+        return connection
+
+    def read(self, connection, n, authors):
+        connection.execute(
+            'SELECT id, text FROM post WHERE author = ? '
+            'ORDER BY pub_date DESC LIMIT 10', (n % authors,)).fetchall()
+
+    def write(self, connection, n, authors):
+        author = n % authors
+        connection.execute(f'BEGIN {self.transaction_mode}')
+        try:
+            connection.execute(
+                'SELECT posts FROM counter WHERE author = ?', (author,))
+            connection.execute(
+                'INSERT INTO post (author, text, pub_date) VALUES (?, ?, ?)',
+                (author, f'Новый пост {n}', time.time()))
+            connection.execute(
+                'UPDATE counter SET posts = posts + 1 WHERE author = ?',
+                (author,))
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            connection.execute('ROLLBACK')
+            raise
+
+    def worker(self, operation, path, pragmas, deadline, options, stats):
+        connection = self.connect(path, pragmas)
+        done = errors = n = 0
+        while time.monotonic() < deadline:
+            n += 1
+            try:
+                operation(connection, n, options['authors'])
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        connection.close()
+        with self.lock:
+            stats[operation.__name__] += done
+            stats['errors'] += errors
+
+    def run(self, pragmas, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            self.seed(path, options)
+            connection = self.connect(path, pragmas)
+            journal = connection.execute('PRAGMA journal_mode').fetchone()[0]
+            connection.close()
+            stats = {'read': 0, 'write': 0, 'errors': 0}
+            deadline = time.monotonic() + options['seconds']
+            threads = [
+                threading.Thread(target=self.worker, args=(
+                    operation, path, pragmas, deadline, options, stats))
+                for operation, count in ((self.read, options['readers']),
+                                         (self.write, options['writers']))
+                for _ in range(count)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        seconds = options['seconds']
+        return (journal, stats['read'] / seconds, stats['write'] / seconds,
+                stats['errors'])
+
+    def handle(self, *args, **options):
+        self.lock = threading.Lock()
+        self.stdout.write(f'{"PRAGMA":<16}{"журнал":>8}{"чтений/с":>12}'
+                          f'{"записей/с":>12}{"ошибок":>10}')
+        configured = settings.DATABASES['default'].get('OPTIONS', {}).get(
+            'transaction_mode', 'DEFERRED')
+        for name, pragmas, self.transaction_mode in (
+                ('по умолчанию', {}, 'DEFERRED'),
+                ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS, configured)):
+            journal, reads, writes, errors = self.run(pragmas, options)
+            self.stdout.write(f'{name:<16}{journal:>8}{reads:>12.0f}'
+                              f'{writes:>12.0f}{errors:>10}')
@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import maintenance
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание SQLite на работающем сайте: ANALYZE с '
+            'analysis_limit и PRAGMA optimize, затем incremental_vacuum '
+            'короткими шагами, пока не выйдет --max-seconds, и отчёт по '
+            'таблицам SQLITE_MAINTENANCE_TABLES.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--max-seconds', type=float, default=30,
+            help='общий бюджет времени на ANALYZE и вакуум',
+        )
+        parser.add_argument(
+            '--analysis-limit', type=int, default=1000,
+            help='строк индекса, которые читает ANALYZE',
+        )
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=1000,
+            help='страниц за один шаг incremental_vacuum',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='пауза между шагами вакуума, с',
+        )
+        parser.add_argument(
+            '--enable-incremental', action='store_true',
+            help='один раз перевести файл в auto_vacuum=INCREMENTAL '
+                 'полным VACUUM (блокирует базу на время работы)',
+        )
+        parser.add_argument(
+            '--report-only', action='store_true',
+            help='только отчёт, без ANALYZE и вакуума',
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'{options["database"]}: не SQLite')
+        tables = settings.SQLITE_MAINTENANCE_TABLES
+        deadline = time.monotonic() + options['max_seconds']
+        with connection.cursor() as cursor:
+            if options['enable_incremental']:
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+            if not options['report_only']:
+                analyzed = maintenance.analyze(
+                    cursor, tables, options['analysis_limit'], deadline)
+                freed = maintenance.incremental_vacuum(
+                    cursor, options['vacuum_pages'], deadline,
+                    options['pause'])
+                self.stderr.write(
+                    f'ANALYZE: {", ".join(analyzed) or "-"}; '
+                    f'освобождено страниц: {freed}')
+            report = maintenance.report(cursor, tables)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_report(report)
+
+    def write_report(self, report):
+        auto_vacuum = ('none', 'full', 'incremental')[report['auto_vacuum']]
+        self.stdout.write(
+            f'Страниц: {report["page_count"]} по {report["page_size"]} '
+            f'байт, свободных: {report["freelist_count"]}, '
+            f'auto_vacuum: {auto_vacuum}')
+        self.stdout.write(f'{"таблица / индекс":<40}{"строк":>10}'
+                          f'{"КиБ":>10}{"пусто":>8}')
+        for table in report['tables']:
+            rows = '?' if table['rows'] is None else table['rows']
+            fragmentation = ('?' if table['fragmentation'] is None
+                             else f'{table["fragmentation"]:.0%}')
+            self.stdout.write(
+                f'{table["table"]:<40}{rows:>10}'
+                f'{kib(table["bytes"]):>10}{fragmentation:>8}')
+            for name, size in table['indexes'].items():
+                self.stdout.write(f'  {name:<38}{"":>10}{kib(size):>10}')
+
+
+def kib(size):
+    return '?' if size is None else size // 1024
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.sqlite import read_pragmas
+
+
+class Command(BaseCommand):
+    help = 'Показывает PRAGMA, действующие на соединении с SQLite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'{options["database"]}: не SQLite')
+        connection.ensure_connection()
+        pragmas = getattr(connection, 'pragmas', settings.SQLITE_PRAGMAS)
+        values = read_pragmas(connection.connection, pragmas)
+        self.stdout.write(
+            f'{"PRAGMA":<16}{"в настройках":>16}{"действует":>16}')
+        for name, expected in pragmas.items():
+            self.stdout.write(
+                f'{name:<16}{str(expected):>16}{str(values[name]):>16}')
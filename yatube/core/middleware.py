@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+
+from .queries import logger, record_queries
+from .routers import read_from_replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+STICKY_COOKIE = 'primary_until'
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL каждого запроса и предупреждает о превышении
+    QUERY_BUDGETS для имени URL и о повторах N+1."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as report:
+            response = self.get_response(request)
+        match = request.resolver_match
+        report.name = match.view_name if match else None
+        for problem in report.problems():
+            logger.warning(problem)
+        response.query_report = report
+        return response
+
+
+class ReplicaMiddleware:
+    """Отправляет чтение безопасных запросов на реплики.
+
+    После запроса, который что-то записал, браузер на
+    REPLICA_STICKY_SECONDS получает куку, и его запросы читают из
+    основной базы: после post_create профиль, а после add_comment пост
+    показывают новое содержимое, даже если реплика отстала. Ставится до
+    SessionMiddleware, чтобы и сессия читалась из нужной базы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        allowed = request.method in SAFE_METHODS and not self.sticky(request)
+        with read_from_replicas(allowed) as current:
+            response = self.get_response(request)
+            wrote = current.wrote
+        if wrote:
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + seconds), max_age=seconds,
+                httponly=True, samesite='Lax')
+        return response
+
+    def sticky(self, request):
+        try:
+            until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            return False
+        return time.time() < until
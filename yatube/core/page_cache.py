@@ -0,0 +1,95 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.http import quote_etag
+
+from .routers import cache_tag
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'core:page:{path}{cache_tag()}'
+
+
+def is_cacheable(request):
+    return (request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated)
+
+
+def should_refresh(entry, version):
+    """Устарела ли запись: другая версия, истёк срок или ранний
+    вероятностный пересчёт (XFetch) незадолго до истечения."""
+    if entry['version'] != version:
+        return True
+    early = entry['delta'] * settings.PAGE_CACHE_BETA * -math.log(
+        1 - random.random())
+    return time.time() + early >= entry['expires']
+
+
+def store(key, response, version, delta):
+    if (response.status_code != 200 or response.cookies
+            or response.streaming):
+        return
+    cache.set(key, {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': list(response.items()),
+        'version': version,
+        'delta': delta,
+        'expires': time.time() + settings.PAGE_CACHE_TIMEOUT,
+    }, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE)
+
+
+def restore(entry, key=None, version=None):
+    """Ответ из записи кеша. Копия другой версии получает ETag своей
+    версии: под ETag текущей её бы закрепили 304-е ответы."""
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    if version is not None and entry['version'] != version:
+        stale = hashlib.md5(f'{key}|{entry["version"]}'.encode())
+        response['ETag'] = quote_etag(stale.hexdigest())
+        if response.has_header('Last-Modified'):
+            del response['Last-Modified']
+    return response
+
+
+def cache_anonymous_page(version):
+    """Кеширует страницу целиком для анонимных GET-запросов.
+
+    version(request, **kwargs) — текущая версия содержимого страницы;
+    запись другой версии считается устаревшей. Пересчитывает страницу
+    один воркер, взявший блокировку, остальные пока получают старую
+    копию. Ответы, которые выставили CSRF-токен или куки, не кешируются.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            current = version(request, *args, **kwargs)
+            entry = cache.get(key)
+            if entry is not None and not should_refresh(entry, current):
+                return restore(entry)
+            locked = cache.add(
+                f'{key}:lock', 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked and entry is not None:
+                return restore(entry, key, current)
+            try:
+                started = time.time()
+                response = view(request, *args, **kwargs)
+                if not request.META.get('CSRF_COOKIE_USED'):
+                    store(key, response, current, time.time() - started)
+                return response
+            finally:
+                if locked:
+                    cache.delete(f'{key}:lock')
+        return wrapper
+    return decorator
@@ -0,0 +1,115 @@
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SPACES = re.compile(r'\s+')
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)(.*)$')
+
+
+def fingerprint(sql):
+    """Нормализует SQL: литералы и списки IN заменяются заглушками."""
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = LITERAL.sub('?', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+class QueryReport:
+    """SQL одного запроса к сайту, сгруппированный по отпечаткам."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def budget(self):
+        return settings.QUERY_BUDGETS.get(self.name)
+
+    def fingerprints(self):
+        return Counter(fingerprint(sql) for sql in self.queries)
+
+    def repeated(self):
+        """Отпечатки, повторённые в цикле, — признак N+1."""
+        return {
+            sql: count for sql, count in self.fingerprints().items()
+            if count >= settings.QUERY_N_PLUS_ONE_THRESHOLD
+        }
+
+    def problems(self):
+        problems = [
+            f'{self.name}: N+1, {count} раз: {sql}'
+            for sql, count in self.repeated().items()
+        ]
+        if self.budget is not None and len(self) > self.budget:
+            problems.append(
+                f'{self.name}: {len(self)} запросов при бюджете '
+                f'{self.budget}')
+        return problems
+
+
+@contextmanager
+def record_queries(name=None):
+    """Записывает SQL всех подключений в QueryReport."""
+    report = QueryReport(name)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(report))
+        yield report
+
+
+class QueryBudgetMixin:
+    """Для TestCase: ответ укладывается в бюджет запросов и без N+1."""
+
+    def assertQueryBudget(self, response):
+        problems = response.query_report.problems()
+        self.assertFalse(problems, '\n'.join(problems))
+
+
+def explain(connection, sql, params=None):
+    """Строки EXPLAIN QUERY PLAN (SQLite) для запроса."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(sql, plan, allowed_tables=()):
+    """Шаги плана с сортировкой во временном B-дереве или полным
+    сканированием таблицы.
+
+    SCAN допустим, только если запрос с ORDER BY и LIMIT — это обход
+    в нужном порядке, который останавливается на LIMIT — и идёт по
+    индексу либо по всей таблице без WHERE. Подзапросы и виртуальные
+    таблицы (FTS) не проверяются: их строки видны отдельными шагами.
+    allowed_tables — маленькие справочники, которые читаются целиком
+    намеренно.
+    """
+    bounded = 'ORDER BY' in sql and 'LIMIT' in sql
+    problems = []
+    for detail in plan:
+        if 'TEMP B-TREE' in detail:
+            problems.append(detail)
+            continue
+        match = SCAN.match(detail)
+        if not match or 'VIRTUAL TABLE' in detail:
+            continue
+        table, rest = match.groups()
+        if (table in ('subquery', 'CONSTANT') or table.startswith('(')
+                or table in allowed_tables):
+            continue
+        if not bounded or ('INDEX' not in rest and 'WHERE' in sql):
+            problems.append(detail)
+    return problems
@@ -0,0 +1,72 @@
+"""Перекодирование загруженной картинки в отдельном процессе.
+
+python -m core.reencode SOURCE TARGET FORMAT MAX_BYTES MAX_PIXELS
+
+Процесс сам ограничивает себе адресное пространство до MAX_BYTES,
+поэтому неудачная картинка может уронить только его, а не воркер.
+Django здесь не импортируется.
+"""
+import resource
+import sys
+import warnings
+
+from PIL import Image, ImageOps, ImageSequence
+
+# Данные, которые нужны для верного отображения; остальное из info
+# (EXIF, ICC, XMP, комментарии) не переносится.
+KEPT_INFO = ('transparency',)
+
+
+def strip_info(image):
+    image.info = {
+        key: value for key, value in image.info.items()
+        if key in KEPT_INFO
+    }
+    return image
+
+
+def reencode_animation(image, target, image_format):
+    """Сохраняет все кадры анимации (GIF, WebP, APNG) с их
+    длительностью и числом повторов."""
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frames.append(strip_info(ImageOps.exif_transpose(frame.copy())))
+    options = {
+        'save_all': True,
+        'append_images': frames[1:],
+        'duration': durations,
+    }
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    frames[0].save(target, image_format, **options)
+
+
+def reencode(source, target, image_format):
+    with Image.open(source) as image:
+        if getattr(image, 'is_animated', False):
+            reencode_animation(image, target, image_format)
+            return
+        image.load()
+        image = strip_info(ImageOps.exif_transpose(image))
+        options = {}
+        if image_format == 'JPEG':
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            options['quality'] = 90
+        if 'transparency' in image.info:
+            options['transparency'] = image.info['transparency']
+        image.save(target, image_format, **options)
+
+
+def main(argv):
+    source, target, image_format, max_bytes, max_pixels = argv
+    max_bytes = int(max_bytes)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    Image.MAX_IMAGE_PIXELS = int(max_pixels)
+    warnings.simplefilter('error', Image.DecompressionBombWarning)
+    reencode(source, target, image_format)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
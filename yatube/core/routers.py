@@ -0,0 +1,95 @@
+import os
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+state = threading.local()
+
+
+def replicas_allowed():
+    return getattr(state, 'replicas', False)
+
+
+def wrote():
+    return getattr(state, 'wrote', False)
+
+
+def current_replica():
+    """Реплика, из которой сейчас читает поток, или None, если чтение
+    идёт в основную базу."""
+    if (not settings.DATABASE_REPLICAS or not replicas_allowed() or wrote()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+        return None
+    return state.replica
+
+
+def snapshot_tag(alias):
+    """Метка снимка реплики: алиас и, для файла SQLite, inode и время
+    изменения — backup_db подменяет файл целиком."""
+    try:
+        stat = os.stat(connections.databases.get(alias, {}).get('NAME', ''))
+    except OSError:
+        return alias
+    return f'{alias}.{stat.st_ino}.{stat.st_mtime_ns}'
+
+
+def cache_tag():
+    """Добавка к ключам общих кешей и ETag: пусто при чтении из
+    основной базы, метка снимка — при чтении с реплики. Отставшая
+    реплика не кладёт старое содержимое под ключи, которые читает
+    писатель, а после обновления копии её записи больше не читаются."""
+    return '' if current_replica() is None else state.tag
+
+
+@contextmanager
+def read_from_replicas(allowed=True):
+    """Внутри блока чтение, для которого нет причины идти в основную
+    базу, уходит на одну случайную реплику. Запись в этом же потоке
+    возвращает последующее чтение блока в основную базу."""
+    previous = (replicas_allowed(), wrote(), getattr(state, 'replica', None),
+                getattr(state, 'tag', ''))
+    state.replicas, state.wrote = allowed, False
+    state.replica = state.tag = None
+    if allowed and settings.DATABASE_REPLICAS:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+        state.tag = snapshot_tag(state.replica)
+    try:
+        yield state
+    finally:
+        state.replicas, state.wrote, state.replica, state.tag = previous
+
+
+class PrimaryReplicaRouter:
+    """Запись и миграции — в основную базу, чтение — на случайную
+    реплику из DATABASE_REPLICAS.
+
+    На реплики идёт только чтение внутри read_from_replicas (его
+    включает ReplicaMiddleware для безопасных запросов), вне транзакции
+    основной базы и пока в потоке ничего не записано. Команды, задачи
+    и всё остальное читают из основной базы. Объекты, загруженные с
+    реплики, подгружают связанные с той же реплики.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = current_replica()
+        if replica is None:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if (instance is not None
+                and instance._state.db in settings.DATABASE_REPLICAS):
+            return instance._state.db
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,23 @@
+import re
+
+PRAGMA_NAME = re.compile(r'^\w+$')
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA name = value на соединении DB-API sqlite3."""
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f'Недопустимая PRAGMA: {name} = {value}')
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def read_pragmas(connection, names):
+    """{имя: значение} для PRAGMA, действующих на соединении."""
+    values = {}
+    for name in names:
+        if not PRAGMA_NAME.match(name):
+            raise ValueError(f'Недопустимая PRAGMA: {name}')
+        row = connection.execute(f'PRAGMA {name}').fetchone()
+        values[name] = row[0] if row else None
+    return values
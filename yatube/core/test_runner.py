@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def temporary_caches():
+    """Кеши с LOCATION во временном каталоге, который удаляется на
+    выходе: записи и поколения не переживают прогон тестов и не
+    смешиваются с dev-сервером."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    caches = {
+        alias: {**config,
+                'LOCATION': os.path.join(directory, f'{alias}.sqlite3')}
+        for alias, config in settings.CACHES.items()
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    """DiscoverRunner, который гоняет тесты на temporary_caches."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches = temporary_caches()
+        self.caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,446 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django import forms
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from . import backup, maintenance
+from .backends.sqlite3.base import DatabaseWrapper
+from .cache_backends import TwoTierCache
+from .sqlite import apply_pragmas, read_pragmas
+from .storage import ContentAddressedStorage
+from .test_runner import temporary_caches
+from .uploads import LimitedUploadHandler, clean_image, pop_too_large
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        options.setdefault('SYNC_INTERVAL', 0)
+        return TwoTierCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """Кеш поддерживает операции BaseCache."""
+        cache = self.make_cache()
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 2))
+        self.assertTrue(cache.add('other', 2))
+        self.assertEqual(cache.incr('other', 3), 5)
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        cache.set('expired', 1, 0)
+        self.assertIsNone(cache.get('expired'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+
+    def test_tests_use_temporary_location(self):
+        """Под тестами общий кеш лежит во временном каталоге, а не
+        в cache.sqlite3 проекта."""
+        location = settings.CACHES['default']['LOCATION']
+        self.assertTrue(location.startswith(tempfile.gettempdir()))
+        self.assertFalse(location.startswith(settings.BASE_DIR))
+        self.assertEqual(caches['default'].location, location)
+
+    def test_temporary_caches_removed(self):
+        """temporary_caches удаляет свой каталог на выходе."""
+        with temporary_caches() as directory:
+            caches['default'].set('key', 1)
+            self.assertTrue(os.listdir(directory))
+        self.assertFalse(os.path.exists(directory))
+
+    def test_cross_process_invalidation(self):
+        """Запись одного процесса выбрасывает ключ из L1 другого."""
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'new')
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_touch_invalidates_other_processes(self):
+        """Новый срок из touch доходит до L1 другого процесса."""
+        first, second = self.make_cache(), self.make_cache()
+        first.set('key', 1)
+        self.assertEqual(second.get('key'), 1)
+        self.assertTrue(first.touch('key', 0))
+        self.assertIsNone(second.get('key'))
+
+    def test_tier_stats(self):
+        """Статистика считает попадания и промахи каждого уровня."""
+        writer, reader = self.make_cache(), self.make_cache()
+        writer.set('key', 1)
+        reader.get('key')
+        reader.get('key')
+        reader.get('missing')
+        self.assertEqual(reader.stats(), {
+            'hits': {'l1': 1, 'l2': 1},
+            'misses': {'l1': 2, 'l2': 1},
+        })
+
+    def test_l1_bounded(self):
+        """L1 хранит не больше L1_MAX_ENTRIES записей."""
+        cache = self.make_cache(L1_MAX_ENTRIES=2)
+        cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(len(cache.l1.entries), 2)
+        self.assertEqual(cache.get('a'), 1)
+
+
+def png_header(width, height):
+    """PNG, в котором есть только заголовок с размерами."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2,
+                                         0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b''))
+            + chunk(b'IEND', b''))
+
+
+def jpeg_with_exif():
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class UploadTests(SimpleTestCase):
+    @override_settings(UPLOAD_MAX_BYTES=10)
+    def test_handler_stops_writing_after_limit(self):
+        """Обработчик не пишет на диск больше UPLOAD_MAX_BYTES и
+        помечает файл, который потом убирается из формы."""
+        handler = LimitedUploadHandler()
+        handler.new_file('image', 'big.gif', 'image/gif', None)
+        for start in range(0, 100, 8):
+            handler.receive_data_chunk(b'x' * 8, start)
+        upload = handler.file_complete(100)
+        self.assertTrue(upload.too_large)
+        self.assertEqual(
+            os.path.getsize(upload.temporary_file_path()), 0)
+        files, removed = pop_too_large({'image': upload}, 'image')
+        self.assertTrue(removed)
+        self.assertEqual(files, {})
+        upload.close()
+
+    def test_decompression_bomb_rejected_by_header(self):
+        """Картинка с огромными размерами в заголовке отвергается без
+        декодирования пикселей."""
+        upload = SimpleUploadedFile('bomb.png', png_header(100000, 100000))
+        with self.assertRaises(forms.ValidationError) as error:
+            clean_image(upload)
+        self.assertEqual(error.exception.code, 'image_too_large')
+
+    @override_settings(UPLOAD_MAX_PIXELS=15)
+    def test_dimensions_limit(self):
+        """Картинка больше UPLOAD_MAX_PIXELS отвергается."""
+        upload = SimpleUploadedFile('photo.jpg', jpeg_with_exif())
+        with self.assertRaises(forms.ValidationError) as error:
+            clean_image(upload)
+        self.assertEqual(error.exception.code, 'image_too_large')
+
+    def test_reencoded_without_metadata(self):
+        """Картинка перекодируется в том же формате и под тем же
+        именем, но без EXIF."""
+        upload = SimpleUploadedFile('photo.jpg', jpeg_with_exif())
+        cleaned = clean_image(upload)
+        self.assertEqual(cleaned.name, 'photo.jpg')
+        with Image.open(cleaned.temporary_file_path()) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (4, 4))
+            self.assertNotIn('exif', image.info)
+        cleaned.close()
+
+    def test_animated_gif_keeps_frames(self):
+        """Анимированный GIF сохраняет все кадры, их длительность и
+        число повторов."""
+        buffer = BytesIO()
+        frames = [Image.new('RGB', (4, 4), color)
+                  for color in ('red', 'green', 'blue')]
+        frames[0].save(buffer, 'GIF', save_all=True,
+                       append_images=frames[1:], duration=[50, 100, 150],
+                       loop=0, comment=b'secret')
+        cleaned = clean_image(
+            SimpleUploadedFile('anim.gif', buffer.getvalue()))
+        with Image.open(cleaned.temporary_file_path()) as image:
+            self.assertEqual(image.n_frames, 3)
+            self.assertEqual(image.info['loop'], 0)
+            self.assertNotIn('comment', image.info)
+            durations = []
+            for frame in range(image.n_frames):
+                image.seek(frame)
+                durations.append(image.info['duration'])
+            self.assertEqual(durations, [50, 100, 150])
+        cleaned.close()
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def test_identical_content_stored_once(self):
+        """Одинаковое содержимое под разными именами хранится одним
+        файлом в каталоге исходного имени."""
+        first = self.storage.save(
+            'posts/a.GIF', SimpleUploadedFile('a.GIF', b'same'))
+        second = self.storage.save(
+            'posts/b.gif', SimpleUploadedFile('b.gif', b'same'))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(self.storage.path(first)))), 1)
+
+    def test_different_content_different_names(self):
+        """Разное содержимое получает разные имена."""
+        first = self.storage.save('a.gif', SimpleUploadedFile('a.gif', b'1'))
+        second = self.storage.save('a.gif', SimpleUploadedFile('a.gif', b'2'))
+        self.assertNotEqual(first, second)
+        with self.storage.open(second) as file:
+            self.assertEqual(file.read(), b'2')
+
+
+class SQLiteBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+
+    def test_pragmas_applied(self):
+        """SQLITE_PRAGMAS действуют на соединении Django, команда
+        sqlite_pragmas их показывает."""
+        connection.ensure_connection()
+        values = read_pragmas(
+            connection.connection,
+            ['busy_timeout', 'synchronous', 'cache_size', 'temp_store'])
+        self.assertEqual(values, {
+            'busy_timeout': 5000, 'synchronous': 1,
+            'cache_size': -64000, 'temp_store': 2})
+        out = StringIO()
+        call_command('sqlite_pragmas', stdout=out)
+        self.assertIn('busy_timeout', out.getvalue())
+
+    def test_wal_on_file_database(self):
+        """На файле базы включается WAL."""
+        database = DatabaseWrapper({**connection.settings_dict,
+                                    'NAME': self.path})
+        database.ensure_connection()
+        self.addCleanup(database.close)
+        self.assertEqual(read_pragmas(
+            database.connection, ['journal_mode']), {'journal_mode': 'wal'})
+
+    def test_immediate_transaction(self):
+        """atomic сразу берёт блокировку записи: второй писатель не
+        может начать транзакцию, пока первая открыта."""
+        database = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': self.path,
+            'OPTIONS': {'transaction_mode': 'immediate'}})
+        database.ensure_connection()
+        self.addCleanup(database.close)
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        database._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+        database.connection.execute('ROLLBACK')
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+    def test_invalid_pragma_rejected(self):
+        """Имя и значение PRAGMA не подставляются в SQL как есть."""
+        with self.assertRaises(ValueError):
+            apply_pragmas(sqlite3.connect(':memory:'),
+                          {'cache_size': '1; DROP TABLE x'})
+
+
+class MaintenanceTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.database = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(directory, 'db.sqlite3')})
+        self.database.ensure_connection()
+        self.addCleanup(self.database.close)
+        self.cursor = self.database.cursor()
+        self.cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, '
+                            'name TEXT)')
+        self.cursor.execute('CREATE INDEX item_name ON item (name)')
+        self.cursor.executemany('INSERT INTO item (name) VALUES (%s)',
+                                [('x' * 200,)] * 2000)
+        self.cursor.execute('DELETE FROM item WHERE id % 10 != 0')
+
+    def test_analyze_and_incremental_vacuum(self):
+        """ANALYZE даёт оценку строк, вакуум шагами освобождает все
+        свободные страницы, отчёт видит таблицу и её индекс."""
+        deadline = time.monotonic() + 10
+        self.assertEqual(maintenance.analyze(
+            self.cursor, ['item'], 100, deadline), ['item'])
+        self.assertGreater(maintenance.pragma(
+            self.cursor, 'freelist_count'), 0)
+        freed = maintenance.incremental_vacuum(self.cursor, 10, deadline)
+        self.assertGreater(freed, 0)
+        self.assertEqual(maintenance.pragma(
+            self.cursor, 'freelist_count'), 0)
+        report = maintenance.report(self.cursor, ['item'])
+        self.assertEqual(report['freelist_count'], 0)
+        table = report['tables'][0]
+        self.assertAlmostEqual(table['rows'], 200, delta=100)
+        self.assertIn('item_name', table['indexes'])
+        self.assertGreater(table['fragmentation'], 0)
+
+    def test_time_box(self):
+        """После дедлайна ни ANALYZE, ни вакуум не выполняются."""
+        deadline = time.monotonic()
+        self.assertEqual(
+            maintenance.analyze(self.cursor, ['item'], 100, deadline), [])
+        self.assertEqual(
+            maintenance.incremental_vacuum(self.cursor, 10, deadline), 0)
+
+    def test_command(self):
+        """Команда печатает отчёт по таблицам из настроек."""
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out, stderr=StringIO())
+        self.assertIn('posts_post', out.getvalue())
+        self.assertIn('django_session', out.getvalue())
+
+
+class BackupTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        # Таблицы постов и комментариев тестовой базы в файле, чтобы
+        # писать в него из потоков.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' "
+                "AND name IN ('posts_post', 'posts_comment')")
+            schema = [row[0] for row in cursor.fetchall()]
+        target = sqlite3.connect(self.path)
+        target.execute('PRAGMA journal_mode = WAL')
+        for sql in schema:
+            target.execute(sql)
+        target.close()
+        database = sqlite3.connect(self.path, isolation_level=None)
+        for _ in range(300):
+            self.write(database)
+        database.close()
+
+    def write(self, database):
+        """Пост и комментарий к нему одной транзакцией."""
+        database.execute('BEGIN IMMEDIATE')
+        database.execute(
+            "INSERT INTO posts_post (text, pub_date, author_id, image, "
+            "comments_count, version, image_variants) VALUES "
+            "(?, '2026-01-01', 1000, '', 1, 1, '')", ('x' * 500,))
+        database.execute(
+            "INSERT INTO posts_comment (post_id, author_id, text, created) "
+            "VALUES (last_insert_rowid(), 1000, 'к', '2026-01-01')")
+        database.execute('COMMIT')
+
+    def count(self, path, table):
+        database = sqlite3.connect(path)
+        try:
+            return database.execute(
+                f'SELECT count(*) FROM {table}').fetchone()[0]
+        finally:
+            database.close()
+
+    def test_backup_under_concurrent_writes(self):
+        """Под записью постов и комментариев копия согласована: в ней
+        столько же комментариев, сколько постов, и она прошла
+        integrity_check; в WAL копирование не перезапускается."""
+        stop = threading.Event()
+        written = []
+
+        def writer():
+            database = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            while not stop.is_set():
+                self.write(database)
+                written.append(1)
+            database.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        copy = os.path.join(self.directory, 'copy.sqlite3')
+        try:
+            while not written:
+                time.sleep(0.001)
+            stats = backup.backup(self.path, copy, 4, 0.001, 0)
+        finally:
+            stop.set()
+            thread.join()
+        backup.verify(copy)
+        self.assertGreater(stats.steps, 10)
+        self.assertEqual(stats.restarts, 0)
+        self.assertEqual(stats.journal_mode, 'wal')
+        posts = self.count(copy, 'posts_post')
+        self.assertEqual(posts, self.count(copy, 'posts_comment'))
+        self.assertGreater(posts, 300)
+        self.assertLessEqual(posts, self.count(self.path, 'posts_post'))
+
+    def test_rollback_journal_reports_lock_time(self):
+        """Вне WAL отчёт показывает время под SHARED-блокировкой."""
+        database = sqlite3.connect(self.path)
+        database.execute('PRAGMA journal_mode = DELETE')
+        database.close()
+        stats = backup.backup(
+            self.path, os.path.join(self.directory, 'copy'), 8, 0, 0)
+        self.assertEqual(stats.journal_mode, 'delete')
+        self.assertGreater(stats.locked, 0)
+        self.assertGreater(stats.max_step, 0)
+
+    def test_corrupt_copy_rejected(self):
+        """Испорченный файл не проходит проверку."""
+        broken = os.path.join(self.directory, 'broken.sqlite3')
+        shutil.copy(self.path, broken)
+        with open(broken, 'r+b') as file:
+            file.seek(4096 * 3)
+            file.write(b'\xff' * 4096)
+        with self.assertRaises((backup.BackupFailed, sqlite3.DatabaseError)):
+            backup.verify(broken)
+
+    def test_command_gzip(self):
+        """Команда пишет сжатую копию и отчёт о блокировках."""
+        output = os.path.join(self.directory, 'backup.sqlite3.gz')
+        err = StringIO()
+        with mock.patch.dict(connection.settings_dict, {'NAME': self.path}):
+            call_command('backup_db', output, gzip=True, stderr=err)
+        self.assertIn('WAL', err.getvalue())
+        copy = os.path.join(self.directory, 'restored.sqlite3')
+        with gzip.open(output) as source, open(copy, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        backup.verify(copy)
+        self.assertEqual(self.count(copy, 'posts_post'), 300)
+        # Временный файл копии удалён.
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ['backup.sqlite3.gz', 'db.sqlite3', 'restored.sqlite3'])
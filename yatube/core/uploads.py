@@ -0,0 +1,141 @@
+import os
+import subprocess
+import sys
+import tempfile
+import warnings
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    TemporaryUploadedFile, UploadedFile)
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше UPLOAD_MAX_BYTES.
+
+    Остаток слишком большого файла дочитывается из запроса без записи,
+    а файл помечается too_large, чтобы форма показала ошибку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.file.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            if not self.file.too_large:
+                self.file.too_large = True
+                self.file.truncate(0)
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+
+def temporary_copy(upload):
+    """Путь к файлу загрузки на диске; файл из памяти копируется."""
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path(), None
+    copy = tempfile.NamedTemporaryFile(suffix='.upload')
+    for chunk in upload.chunks():
+        copy.write(chunk)
+    copy.flush()
+    return copy.name, copy
+
+
+def inspect_image(path):
+    """Формат и размеры картинки по заголовку, без декодирования.
+
+    Бомбы распаковки (размеры больше UPLOAD_MAX_PIXELS) отвергаются
+    до того, как Pillow выделит память под пиксели.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            with Image.open(path) as image:
+                image_format, (width, height) = image.format, image.size
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise forms.ValidationError(
+            'Слишком большое разрешение картинки.', code='image_too_large')
+    except Exception:
+        raise forms.ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image')
+    if image_format not in settings.UPLOAD_IMAGE_FORMATS:
+        raise forms.ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='invalid_image_format', params={'format': image_format})
+    if width * height > settings.UPLOAD_MAX_PIXELS:
+        raise forms.ValidationError(
+            'Слишком большое разрешение картинки.', code='image_too_large')
+    return image_format
+
+
+class ReencodedFile(TemporaryUploadedFile):
+    """Результат перекодирования. Его нет в request.FILES, поэтому
+    Django не закроет его в конце запроса; файл закрывается сам, и
+    close() не падает, если хранилище уже перенесло его."""
+
+    def __del__(self):
+        self.close()
+
+
+def reencode(path, upload, image_format):
+    """Перекодирует картинку в отдельном процессе с лимитом памяти.
+
+    Возвращает новый временный файл с тем же именем и без метаданных.
+    """
+    result = ReencodedFile(upload.name, upload.content_type, 0, None)
+    try:
+        subprocess.run(
+            [sys.executable, '-m', 'core.reencode', path,
+             result.temporary_file_path(), image_format,
+             str(settings.UPLOAD_REENCODE_MEMORY),
+             str(settings.UPLOAD_MAX_PIXELS)],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+            timeout=settings.UPLOAD_REENCODE_TIMEOUT,
+        )
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        result.close()
+        raise forms.ValidationError(
+            'Не удалось обработать изображение.', code='invalid_image')
+    result.size = os.path.getsize(result.temporary_file_path())
+    result.seek(0)
+    return result
+
+
+def too_large_error():
+    return forms.ValidationError(
+        'Файл больше %(limit)s.', code='file_too_large',
+        params={'limit': filesizeformat(settings.UPLOAD_MAX_BYTES)})
+
+
+def pop_too_large(files, name):
+    """Убирает из files загрузку, обрезанную LimitedUploadHandler.
+
+    Иначе ImageField отверг бы пустой файл как битую картинку, а не
+    сообщил бы о размере. Возвращает files и признак, что файл убран.
+    """
+    upload = files.get(name) if files else None
+    if upload is None or not (getattr(upload, 'too_large', False)
+                              or upload.size > settings.UPLOAD_MAX_BYTES):
+        return files, False
+    files = files.copy()
+    files.pop(name)
+    return files, True
+
+
+def clean_image(upload):
+    """Проверяет новую загрузку по заголовку и заменяет её копией,
+    перекодированной без метаданных. Уже сохранённые файлы и пустое
+    значение возвращаются как есть."""
+    if not isinstance(upload, UploadedFile):
+        return upload
+    path, copy = temporary_copy(upload)
+    try:
+        return reencode(path, upload, inspect_image(path))
+    finally:
+        if copy is not None:
+            copy.close()
@@ -1,9 +1,117 @@
+import datetime
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import QuerySet
+from django.utils import timezone
 
+from . import search
 from .models import Group, Post, Comment, Follow
+from .utils import EstimatedCountPaginator
+
+
+def period_start(day, kind):
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(day, kind):
+    if kind == 'year':
+        return day.replace(year=day.year + 1)
+    if kind == 'month':
+        return (day + datetime.timedelta(days=32)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """QuerySet, у которого dates() обходит индекс по дате прыжками.
+
+    Вместо SELECT DISTINCT по всей выборке каждый следующий год, месяц
+    или день ищется одним запросом «первая дата не раньше начала
+    следующего периода»: запросов столько, сколько периодов, и каждый —
+    поиск по индексу.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        values = self.order_by(field_name).values_list(field_name, flat=True)
+        found = []
+        value = values.first()
+        while value is not None:
+            if isinstance(value, datetime.datetime):
+                value = timezone.localtime(value) if settings.USE_TZ else value
+                value = value.date()
+            start = period_start(value, kind)
+            found.append(start)
+            boundary = datetime.datetime.combine(
+                next_period(start, kind), datetime.time.min)
+            if settings.USE_TZ:
+                boundary = timezone.make_aware(boundary)
+            value = values.filter(**{f'{field_name}__gte': boundary}).first()
+        return found if order == 'ASC' else found[::-1]
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """AutocompleteSelect, который берёт выбранный объект из preloaded,
+    а не отдельным запросом: в list_editable это запрос на строку."""
+    preloaded = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = [str(v) for v in value if v not in ('', None)]
+        if self.preloaded is None or selected != [str(self.preloaded.pk)]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, self.preloaded.pk,
+            self.choices.field.label_from_instance(self.preloaded),
+            True, len(options)))
+        return [(None, options, 0)]
 
 
-class PostAdmin(admin.ModelAdmin):
+class ScalableAdmin(admin.ModelAdmin):
+    """Список для больших таблиц: число строк оценивается, полный
+    COUNT(*) не считается, даты для date_hierarchy ищутся по индексу.
+
+    Поля из autocomplete_fields в list_editable берут выбранный объект
+    из строки, загруженной через list_select_related.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(
+            queryset.model, queryset.query, queryset.db)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        base = super().get_changelist_form(request, **kwargs)
+
+        class ChangeListForm(base):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name, field in self.fields.items():
+                    widget = getattr(field.widget, 'widget', field.widget)
+                    if isinstance(widget, PreloadedAutocompleteSelect):
+                        widget.preloaded = getattr(self.instance, name)
+
+        return ChangeListForm
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,12 +120,20 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'author',
@@ -26,11 +142,19 @@ class CommentAdmin(admin.ModelAdmin):
         'post'
     )
     list_editable = ('text',)
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
 
 
+class GroupAdmin(admin.ModelAdmin):
+    search_fields = ('title',)
+
+
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow)
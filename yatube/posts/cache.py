@@ -0,0 +1,92 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from core.routers import cache_tag
+
+from .models import Comment, Follow
+
+INDEX = 'index'
+GROUP = 'group'
+AUTHOR = 'author'
+FOLLOW = 'follow'
+USERS = 'users'
+GROUPS = 'groups'
+
+
+def new_generation():
+    # Время в мс: после вытеснения счётчика из кеша поколение
+    # не повторит старое, и устаревшие фрагменты не всплывут.
+    return int(time.time() * 1000)
+
+
+def generation_key(scope, pk=None):
+    return f'posts:generation:{scope}:{pk}'
+
+
+def get_generation(scope, pk=None):
+    """Текущее поколение области кеша; входит в ключи фрагментов."""
+    key = generation_key(scope, pk)
+    generation = cache.get(key)
+    if generation is None:
+        generation = new_generation()
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def get_generations(scope, pks):
+    """Поколения нескольких объектов области одним get_many;
+    недостающие заводятся как в get_generation."""
+    keys = [generation_key(scope, pk) for pk in pks]
+    found = cache.get_many(keys)
+    return [
+        found[key] if key in found else get_generation(scope, pk)
+        for key, pk in zip(keys, pks)
+    ]
+
+
+def follow_version(user_id):
+    """Версия ленты подписок: поколение подписок пользователя,
+    поколения авторов, на которых он подписан, и поколение групп.
+    Посты остальных авторов ленту не сбрасывают."""
+    authors = sorted(Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True))
+    parts = [get_generation(FOLLOW, user_id), get_generation(GROUPS),
+             *get_generations(AUTHOR, authors)]
+    return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def bump(scope, pk=None):
+    """Новое поколение области: старые фрагменты больше не читаются."""
+    key = generation_key(scope, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_generation(), None)
+
+
+def page_version(request, *args, **kwargs):
+    """Версия страниц для кеша анонимов: любые правки постов, групп и
+    пользователей сдвигают поколение index."""
+    return f'{get_generation(INDEX)}{cache_tag()}'
+
+
+def page_etag(request, *args, **kwargs):
+    """ETag страницы без рендера: поколение index, адрес, зритель и
+    снимок реплики, если страница читается с неё."""
+    parts = [get_generation(INDEX), request.get_full_path(), cache_tag()]
+    if request.user.is_authenticated:
+        parts += [request.user.pk, get_generation(FOLLOW, request.user.pk)]
+    return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def post_etag(request, post_id):
+    """ETag поста: к page_etag добавляется водяной знак комментариев,
+    посчитанный одним агрегатным запросом."""
+    watermark = Comment.objects.filter(post_id=post_id).aggregate(
+        last=Max('pk'), total=Count('pk'))
+    return hashlib.md5('{}|{last}|{total}'.format(
+        page_etag(request), **watermark).encode()).hexdigest()
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+
+def count_of(model, field):
+    """Подзапрос COUNT(*) по model, сгруппированный по field."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), Value(0))
+
+
+def recount_users(users=None):
+    """Пересчитывает UserCounters с нуля (для всех или для users)."""
+    users = User.objects.all() if users is None else users
+    with transaction.atomic():
+        UserCounters.objects.bulk_create(
+            [UserCounters(user_id=pk) for pk in users.filter(
+                counters__isnull=True).values_list('pk', flat=True)])
+        UserCounters.objects.filter(user__in=users).update(
+            posts_count=count_of(Post, 'author'),
+            followers_count=count_of(Follow, 'author'),
+            following_count=count_of(Follow, 'user'),
+        )
+
+
+def recount():
+    """Чинит расхождения всех счётчиков."""
+    recount_users()
+    Group.objects.update(posts_count=count_of(Post, 'group'))
+    Post.objects.update(comments_count=count_of(Comment, 'post'))
+
+
+def shifted(deltas):
+    return {
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+    }
+
+
+def change_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя F()-выражением.
+
+    Если строки счётчиков ещё нет, она создаётся пересчётом после
+    коммита: каскад удаления пользователя сдвигает его счётчики, пока
+    строка User ещё есть, а после коммита пересчёт её уже не найдёт.
+    """
+    updated = UserCounters.objects.filter(user_id=user_id).update(
+        **shifted(deltas))
+    if not updated:
+        transaction.on_commit(
+            lambda: recount_users(User.objects.filter(pk=user_id)))
+
+
+def change(model, pk, **deltas):
+    """Сдвигает счётчики строки model F()-выражением."""
+    if pk is not None:
+        model.objects.filter(pk=pk).update(**shifted(deltas))
@@ -1,11 +1,14 @@
 from django import forms
 
+from core import uploads
 from .models import Post, Comment
 
 
 class PostForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.files, self.image_too_large = uploads.pop_too_large(
+            self.files, self.add_prefix('image'))
         self.fields['text'].widget.attrs['placeholder'] = (
             'Давай что-нибудь напишем!')
         self.fields['group'].empty_label = (
@@ -23,6 +26,11 @@ class PostForm(forms.ModelForm):
             'group': 'Из уже существующих'
         }
 
+    def clean_image(self):
+        if self.image_too_large:
+            raise uploads.too_large_error()
+        return uploads.clean_image(self.cleaned_data['image'])
+
 
 class CommentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,75 @@
+import threading
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.cache_backends import LRU
+from . import cache
+
+THUMBNAILS = 'thumbnails'
+
+
+class KVStore(CachedDBKVStore):
+    """Хранилище sorl с LRU в памяти процесса перед кешем и БД.
+
+    Любая запись или удаление сдвигает поколение thumbnails в общем
+    кеше; увидев новое поколение, процесс очищает свой LRU. prefetch
+    читает ключи всей страницы одним get_many и одним запросом к БД.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lru = LRU(settings.THUMBNAIL_KVSTORE_LRU_SIZE)
+        self.lock = threading.Lock()
+        self.generation = None
+
+    def sync(self):
+        generation = cache.get_generation(THUMBNAILS)
+        with self.lock:
+            if generation != self.generation:
+                self.lru.clear()
+                self.generation = generation
+
+    def remember(self, values):
+        with self.lock:
+            for key, value in values.items():
+                self.lru.set(key, value, None)
+
+    def prefetch(self, image_files):
+        """Загружает в LRU записи image_files, которых там ещё нет."""
+        self.sync()
+        keys = {add_prefix(image_file.key) for image_file in image_files}
+        with self.lock:
+            keys = [key for key in keys if self.lru.get(key) is None]
+        if not keys:
+            return
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            loaded = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(loaded)
+        self.remember(found)
+
+    def _get_raw(self, key):
+        self.sync()
+        with self.lock:
+            value = self.lru.get(key)
+        if value is None:
+            value = super()._get_raw(key)
+            self.remember({key: EMPTY_VALUE if value is None else value})
+        return None if value == EMPTY_VALUE else value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        cache.bump(THUMBNAILS)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        cache.bump(THUMBNAILS)
@@ -0,0 +1,107 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.db.models.signals import post_delete, post_save
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.test_runner import temporary_caches
+from posts import counters, signals, timeline
+from posts.models import Follow, Post, User
+from posts.utils import CursorPaginator
+
+# Обработчики, которые ставят задачи в очередь: во время замера они
+# выключены, чтобы бенчмарк не оставлял работы воркерам.
+TASK_RECEIVERS = (
+    (post_save, signals.sync_author_timelines, Follow),
+    (post_delete, signals.sync_author_timelines, Follow),
+    (post_save, signals.release_replaced_image, Post),
+    (post_delete, signals.release_deleted_image, Post),
+)
+
+
+@contextmanager
+def muted(receivers):
+    for signal, receiver, sender in receivers:
+        signal.disconnect(receiver, sender=sender)
+    try:
+        yield
+    finally:
+        for signal, receiver, sender in receivers:
+            signal.connect(receiver, sender=sender)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает ленту подписок в режимах pull, push и hybrid. '
+            'Данные создаются в транзакции и откатываются, кеш — '
+            'временный, задачи в очередь не ставятся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--threshold', type=int, default=500)
+
+    def measure(self, func):
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000, len(queries)
+
+    def seed(self, options):
+        star = User.objects.create(username='bench_star')
+        User.objects.bulk_create(
+            User(username=f'bench_author_{i}')
+            for i in range(options['authors']))
+        User.objects.bulk_create(
+            User(username=f'bench_reader_{i}')
+            for i in range(options['followers']))
+        authors = list(User.objects.filter(username__startswith='bench_a'))
+        readers = list(User.objects.filter(username__startswith='bench_r'))
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=star) for reader in readers]
+            + [Follow(user=readers[0], author=author) for author in authors])
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author)
+            for author in [star] + authors
+            for i in range(options['posts']))
+        counters.recount_users()
+        return star, authors[0], readers[0]
+
+    def read(self, reader):
+        posts, streams = timeline.feed(reader)
+        page = CursorPaginator(
+            posts, settings.POSTS_PER_PAGE, streams).get_cursor_page()
+        list(page)
+
+    def handle(self, *args, **options):
+        # Поколения кеша, сдвинутые сигналами, откат не вернёт.
+        with temporary_caches(), muted(TASK_RECEIVERS):
+            self.compare(options)
+
+    def compare(self, options):
+        with transaction.atomic():
+            star, author, reader = self.seed(options)
+            self.stdout.write(
+                f'{"режим":<8}{"пост звезды":>22}{"пост автора":>22}'
+                f'{"чтение ленты":>22}')
+            for mode in (timeline.PULL, timeline.PUSH, timeline.HYBRID):
+                with override_settings(
+                        FEED_MODE=mode,
+                        FEED_PULL_THRESHOLD=options['threshold']):
+                    timeline.rebuild()
+                    results = (
+                        self.measure(lambda: Post.objects.create(
+                            text='Пост звезды', author=star)),
+                        self.measure(lambda: Post.objects.create(
+                            text='Пост автора', author=author)),
+                        self.measure(lambda: self.read(reader)),
+                    )
+                self.stdout.write(f'{mode:<8}' + ''.join(
+                    f'{ms:>12.1f} мс {count:>4} зап.'
+                    for ms, count in results))
+            transaction.set_rollback(True)
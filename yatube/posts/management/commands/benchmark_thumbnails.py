@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default
+from sorl.thumbnail.images import serialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.test_runner import temporary_caches
+from posts.kvstore import KVStore
+from posts.models import Post, User
+from posts.thumbnails import thumbnail_file
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает число запросов на странице index с хранилищем '
+            'sorl по умолчанию и с posts.kvstore.KVStore. Данные '
+            'создаются в транзакции и откатываются, кеш — временный.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+
+    def measure(self, client):
+        cache.clear()
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            client.get('/')
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000, len(queries)
+
+    def seed(self):
+        author = User.objects.create(username='bench_author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author,
+                 image=f'posts/bench/{i}.jpg')
+            for i in range(settings.POSTS_PER_PAGE))
+        # У половины картинок миниатюра уже есть, у половины — нет.
+        thumbnails = []
+        for i in range(0, settings.POSTS_PER_PAGE, 2):
+            thumbnail = thumbnail_file(f'posts/bench/{i}.jpg', 'card')
+            thumbnail.set_size((960, 339))
+            thumbnails.append(KVStoreModel(
+                key=add_prefix(thumbnail.key),
+                value=serialize_image_file(thumbnail)))
+        KVStoreModel.objects.bulk_create(thumbnails)
+        return author
+
+    def handle(self, *args, **options):
+        # measure очищает кеш: работаем на временном, а не на общем L2.
+        with temporary_caches():
+            self.compare(options['runs'])
+
+    def compare(self, runs):
+        wrapped = default.kvstore._wrapped
+        try:
+            with transaction.atomic():
+                client = Client()
+                client.force_login(self.seed())
+                self.stdout.write(f'{"хранилище":<28}{"прогон":>8}'
+                                  f'{"время":>12}{"запросов":>10}')
+                for name, store in (('sorl cached_db', CachedDBKVStore()),
+                                    ('posts.kvstore', KVStore())):
+                    default.kvstore._wrapped = store
+                    for run in range(1, runs + 1):
+                        ms, count = self.measure(client)
+                        self.stdout.write(
+                            f'{name:<28}{run:>8}{ms:>9.1f} мс{count:>10}')
+                transaction.set_rollback(True)
+        finally:
+            default.kvstore._wrapped = wrapped
@@ -0,0 +1,52 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails, variants
+from posts.models import Post
+
+
+def generate(image):
+    try:
+        thumbnails.generate(image)
+        return image, variants.build(image), None
+    except Exception as error:
+        return image, None, error
+
+
+class Command(BaseCommand):
+    help = ('Создаёт миниатюры и варианты картинок всех постов '
+            'в пуле процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='число процессов, 0 — без пула в текущем процессе',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        images = list(
+            posts.order_by().values_list('image', flat=True).distinct())
+        if options['workers']:
+            # Соединения с БД не должны переходить в дочерние процессы.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    options['workers'],
+                    mp_context=multiprocessing.get_context('fork')) as pool:
+                results = list(pool.map(generate, images, chunksize=8))
+        else:
+            results = [generate(image) for image in images]
+        for image, built, error in results:
+            if error is not None:
+                self.stderr.write(f'{image}: {error}')
+            else:
+                posts.filter(image=image).update(
+                    image_variants=json.dumps(built))
+        thumbnails.refresh(posts)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(images)}'))
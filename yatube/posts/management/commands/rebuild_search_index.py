@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс постов пачками по id, '
+            'не останавливая запись.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.SEARCH_REBUILD_BATCH_SIZE,
+            help='постов в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        total = search.rebuild(options['batch_size'], self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {total}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Сверяет раскладку авторов по лентам с FEED_MODE и '
+            'FEED_PULL_THRESHOLD и дописывает в ленты прежние посты '
+            'авторов, которых начали раскладывать. Нужен после смены '
+            'этих настроек; его же запускает migrate через очередь.')
+
+    def handle(self, *args, **options):
+        moved = timeline.sync()
+        for author_id in moved:
+            timeline.backfill(author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Дополнены ленты подписчиков авторов: {len(moved)}'))
@@ -0,0 +1,100 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:10
+
+from django.db import migrations
+
+# Полнотекстовый индекс постов (SQLite FTS5). rowid строки — id поста,
+# author — логин и имя автора, group_title — название группы. Индекс
+# ведут триггеры, поэтому его не обходят ни bulk_create, ни update().
+# SQLite удаляет триггеры вместе с таблицей: миграция, которая
+# пересоздаёт posts_post, auth_user или posts_group, должна создать их
+# заново, а индекс — пересобрать командой rebuild_search_index.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE posts_post_search USING fts5(
+        text, author, group_title,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO posts_post_search(rowid, text, author, group_title)
+        SELECT new.id, new.text,
+               u.username || ' ' || u.first_name || ' ' || u.last_name,
+               coalesce((SELECT title FROM posts_group
+                         WHERE id = new.group_id), '')
+        FROM auth_user u WHERE u.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_update
+    AFTER UPDATE OF text, author_id, group_id ON posts_post
+    WHEN old.text IS NOT new.text OR old.author_id IS NOT new.author_id
+        OR old.group_id IS NOT new.group_id
+    BEGIN
+        DELETE FROM posts_post_search WHERE rowid = old.id;
+        INSERT INTO posts_post_search(rowid, text, author, group_title)
+        SELECT new.id, new.text,
+               u.username || ' ' || u.first_name || ' ' || u.last_name,
+               coalesce((SELECT title FROM posts_group
+                         WHERE id = new.group_id), '')
+        FROM auth_user u WHERE u.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post
+    BEGIN
+        DELETE FROM posts_post_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_author
+    AFTER UPDATE OF username, first_name, last_name ON auth_user
+    BEGIN
+        UPDATE posts_post_search
+        SET author = new.username || ' ' || new.first_name || ' '
+                     || new.last_name
+        WHERE rowid IN (SELECT id FROM posts_post
+                        WHERE author_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_search_group
+    AFTER UPDATE OF title ON posts_group
+    BEGIN
+        UPDATE posts_post_search SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post
+                        WHERE group_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO posts_post_search(rowid, text, author, group_title)
+    SELECT p.id, p.text,
+           u.username || ' ' || u.first_name || ' ' || u.last_name,
+           coalesce(g.title, '')
+    FROM posts_post p
+    JOIN auth_user u ON u.id = p.author_id
+    LEFT JOIN posts_group g ON g.id = p.group_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER posts_post_search_group',
+    'DROP TRIGGER posts_post_search_author',
+    'DROP TRIGGER posts_post_search_delete',
+    'DROP TRIGGER posts_post_search_update',
+    'DROP TRIGGER posts_post_search_insert',
+    'DROP TABLE posts_post_search',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0010_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
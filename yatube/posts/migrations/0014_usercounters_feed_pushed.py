@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='feed_pushed',
+            field=models.NullBooleanField(),
+        ),
+    ]
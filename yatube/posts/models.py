@@ -1,6 +1,10 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -8,6 +12,7 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
@@ -31,15 +36,37 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True,
     )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # JSON-список готовых вариантов картинки, см. posts.variants.
+    image_variants = models.TextField(blank=True, default='', editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты сортируются по (-pub_date, -id): id в индексе в том же
+        # направлении, иначе SQLite досортировывает его во временном
+        # B-дереве.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_pub_date'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date'),
+        ]
 
     def __str__(self):
         return self.text
 
+    @property
+    def variants(self):
+        return json.loads(self.image_variants) if self.image_variants else []
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -58,6 +85,13 @@ class Comment(models.Model):
         verbose_name='commentes'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created'], name='comment_created'),
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -79,3 +113,49 @@ class Follow(models.Model):
                 name='unique_followings'
             )
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'], name='follow_author_user'),
+        ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Раскладываются ли посты автора по лентам подписчиков сейчас;
+    # None — ещё не сверялось с FEED_MODE, см. timeline.sync.
+    feed_pushed = models.NullBooleanField()
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на подписчика и пост."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date', '-post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entries'
+            )
+        ]
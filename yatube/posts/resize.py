@@ -0,0 +1,205 @@
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image
+
+from .variants import ImageTooLarge, encode
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+# Файл с текущим размером кеша в байтах, в корне RESIZE_CACHE_DIR.
+SIZE_FILE = 'size'
+# Вытеснение освобождает кеш с запасом, до этой доли предела.
+EVICT_TO = 0.9
+
+
+def image_digest(name):
+    """Короткий хеш имени картинки для адреса варианта: после замены
+    картинки адрес другой, поэтому ответ можно кешировать immutable."""
+    return hashlib.sha256(name.encode()).hexdigest()[:16]
+
+
+def resized_url(post_id, name, width, extension):
+    return reverse('posts:post_image_resized', kwargs={
+        'post_id': post_id,
+        'digest': image_digest(name),
+        'width': width,
+        'extension': extension,
+    })
+
+
+def variant_key(name, width, image_format):
+    """Ключ варианта: имя картинки уже адресует содержимое, поэтому
+    вариант по нему никогда не меняется и годится как ETag."""
+    return hashlib.sha256(
+        f'{name}:{width}:{image_format}'.encode()).hexdigest()
+
+
+def variant_path(key, extension):
+    return os.path.join(
+        settings.RESIZE_CACHE_DIR, key[:2], f'{key}.{extension}')
+
+
+def resize(name, width, image_format):
+    """Уменьшает картинку до ширины width, не увеличивая её."""
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ImageTooLarge(
+                f'{name}: {image.width}x{image.height} слишком большая')
+        size = (width, max(image.height * width // image.width, 1))
+        image.draft('RGB', size)
+        image.thumbnail(size, Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info
+                                  else 'RGB')
+        return encode(image, image_format)
+
+
+def scan():
+    """(mtime, размер, путь) всех вариантов и их общий размер."""
+    entries, total = [], 0
+    for root, _, files in os.walk(settings.RESIZE_CACHE_DIR):
+        if root == settings.RESIZE_CACHE_DIR:
+            continue
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    return entries, total
+
+
+def evict(keep=None):
+    """Удаляет давно не читавшиеся варианты, кроме keep, пока кеш
+    больше EVICT_TO * RESIZE_CACHE_MAX_BYTES, и возвращает оставшийся
+    размер. Время чтения — mtime, его сдвигает get. Обходит весь
+    каталог, поэтому account вызывает его, только когда счётчик
+    размера перерос предел."""
+    entries, total = scan()
+    if total <= settings.RESIZE_CACHE_MAX_BYTES:
+        return total
+    target = settings.RESIZE_CACHE_MAX_BYTES * EVICT_TO
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def account(added, keep=None):
+    """Прибавляет added байт к размеру кеша в SIZE_FILE и вытесняет
+    варианты, если кеш перерос RESIZE_CACHE_MAX_BYTES. Без SIZE_FILE
+    (новый или старый кеш) размер считается обходом каталога."""
+    path = os.path.join(settings.RESIZE_CACHE_DIR, SIZE_FILE)
+    with open(path, 'a+') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            file.seek(0)
+            try:
+                total = int(file.read()) + added
+            except ValueError:
+                total = None
+            if total is None or total > settings.RESIZE_CACHE_MAX_BYTES:
+                total = evict(keep)
+            file.seek(0)
+            file.truncate()
+            file.write(str(total))
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def formats():
+    """{расширение: формат Pillow} из RESIZE_FORMATS, которые Pillow
+    умеет сохранять."""
+    Image.init()
+    return {
+        extension: image_format
+        for extension, image_format in settings.RESIZE_FORMATS.items()
+        if image_format in Image.SAVE
+    }
+
+
+def get(name, width, image_format, extension):
+    """Ключ и открытый файл варианта из дискового кеша; при промахе
+    вариант создаётся.
+
+    Промах обрабатывается под flock: параллельные запросы того же
+    варианта, в том числе из других процессов, ждут одного ресайза и
+    читают его результат. Замков 256 по первым символам ключа, чтобы
+    их файлы не копились. Файл открывается сразу, поэтому вытеснение
+    другим процессом ему уже не мешает.
+    """
+    key = variant_key(name, width, image_format)
+    path = variant_path(key, extension)
+    try:
+        os.utime(path)
+        return key, open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_path = os.path.join(settings.RESIZE_CACHE_DIR, f'{key[:2]}.lock')
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        added = 0
+        try:
+            if not os.path.exists(path):
+                data = resize(name, width, image_format)
+                descriptor, temporary = tempfile.mkstemp(
+                    dir=os.path.dirname(path))
+                with os.fdopen(descriptor, 'wb') as file:
+                    file.write(data)
+                os.replace(temporary, path)
+                added = len(data)
+            file = open(path, 'rb')
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    if added:
+        account(added, keep=path)
+    return key, file
+
+
+def byte_range(header, size):
+    """(start, end) из заголовка Range с одним диапазоном.
+
+    None — заголовка нет или он не поддерживается (отдаём весь файл),
+    ValueError — диапазон за пределами файла (416).
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(file, start, end):
+    with file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,152 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.encoding import force_bytes, force_text
+from django.utils.html import escape
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+TERM_RE = re.compile(r'\w+')
+# Границы совпадения в snippet: управляющие символы не встречаются в
+# тексте после escape, поэтому <mark> ставится уже после него.
+MARK_START, MARK_END = '\x02', '\x03'
+
+RANK = f'bm25({TABLE}, %s, %s, %s)'
+
+SEARCH_SQL = f'''
+    SELECT rowid, {RANK} AS search_rank,
+           snippet({TABLE}, 0, char(2), char(3), '…', %s)
+    FROM {TABLE}
+    WHERE {TABLE} MATCH %s{{after}}
+    ORDER BY search_rank, rowid
+    LIMIT %s
+'''
+
+AFTER_SQL = f' AND ({RANK} > %s OR ({RANK} = %s AND rowid > %s))'
+
+ROWS_SQL = f'''
+    INSERT OR REPLACE INTO {TABLE}(rowid, text, author, group_title)
+    SELECT p.id, p.text,
+           u.username || ' ' || u.first_name || ' ' || u.last_name,
+           coalesce(g.title, '')
+    FROM posts_post p
+    JOIN auth_user u ON u.id = p.author_id
+    LEFT JOIN posts_group g ON g.id = p.group_id
+'''
+
+
+def match_query(text):
+    """FTS5-запрос из пользовательского ввода: все слова обязательны,
+    последнее — как префикс. Синтаксис FTS5 во вводе не работает:
+    каждое слово берётся в кавычки."""
+    terms = TERM_RE.findall(text)
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def encode_cursor(rank, pk):
+    """Токен позиции в выдаче: (ранг bm25, id). repr float
+    восстанавливается точно, так что сравнение на равенство работает."""
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{pk}'))
+
+
+def decode_cursor(token):
+    try:
+        rank, pk = force_text(urlsafe_base64_decode(token)).split('|')
+        return float(rank), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(
+        MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search(text, after=None, limit=None):
+    """Посты по запросу text в порядке bm25 и курсор следующей
+    страницы (None, если её нет).
+
+    У постов заполнен snippet — фрагмент текста с подсвеченными
+    совпадениями. Страница берётся по курсору (ранг, id), без OFFSET.
+    """
+    query = match_query(text)
+    if not query:
+        return [], None
+    limit = limit or settings.POSTS_PER_PAGE
+    weights = settings.SEARCH_WEIGHTS
+    params = [*weights, settings.SEARCH_SNIPPET_TOKENS, query]
+    sql = SEARCH_SQL.format(after=AFTER_SQL if after else '')
+    if after:
+        rank, pk = after
+        params += [*weights, rank, *weights, rank, pk]
+    params.append(limit + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, _, _ in rows])
+    results = []
+    for pk, _, snippet in rows:
+        # Строка индекса могла пережить пост в параллельной транзакции.
+        if pk in posts:
+            posts[pk].snippet = highlight(snippet)
+            results.append(posts[pk])
+    next_cursor = None
+    if has_more:
+        pk, rank, _ = rows[-1]
+        next_cursor = encode_cursor(rank, pk)
+    return results, next_cursor
+
+
+def filter_posts(posts, text):
+    """Оставляет в queryset постов подходящие под запрос: один
+    подзапрос к индексу вместо LIKE по всей таблице."""
+    query = match_query(text)
+    if not query:
+        return posts.none()
+    return posts.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [query]))
+
+
+def rebuild(batch_size=None, stdout=None):
+    """Заполняет индекс заново пачками по id.
+
+    Каждая пачка — своя короткая транзакция, так что запись в посты
+    на большой таблице блокируется ненадолго. Триггеры продолжают
+    обновлять индекс, пока идёт пересборка: INSERT OR REPLACE не
+    конфликтует с ними.
+    """
+    batch_size = batch_size or settings.SEARCH_REBUILD_BATCH_SIZE
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid NOT IN '
+            f'(SELECT id FROM posts_post)')
+        last, total = 0, 0
+        while True:
+            with transaction.atomic():
+                cursor.execute(
+                    'SELECT max(id), count(*) FROM (SELECT id FROM '
+                    'posts_post WHERE id > %s ORDER BY id LIMIT %s)',
+                    [last, batch_size])
+                high, count = cursor.fetchone()
+                if not count:
+                    break
+                cursor.execute(
+                    ROWS_SQL + ' WHERE p.id > %s AND p.id <= %s',
+                    [last, high])
+            last, total = high, total + count
+            if stdout is not None:
+                stdout.write(f'Проиндексировано постов: {total}')
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES('optimize')")
+    return total
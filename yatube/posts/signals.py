@@ -0,0 +1,168 @@
+from django.db import router
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import cache, counters, tasks, timeline
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .utils import invalidate_counts
+
+
+@receiver(post_save, sender=Post)
+def push_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_post_counts(sender, **kwargs):
+    invalidate_counts()
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def before_post_save(sender, instance, **kwargs):
+    saved = instance.pk and Post.objects.filter(
+        pk=instance.pk).values_list('group_id', 'image').first()
+    instance._saved_group_id = saved[0] if saved else None
+    instance._saved_image = saved[1] if saved else ''
+    if saved and saved[1] != instance.image.name:
+        instance.image_variants = ''
+    if instance.pk:
+        instance.version = F('version') + 1
+
+
+@receiver(post_save, sender=Post)
+def refresh_post_version(sender, instance, created, **kwargs):
+    # Вместо выражения F на экземпляре остаётся записанный номер.
+    if not created:
+        instance.refresh_from_db(fields=['version'])
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, posts_count=1)
+    elif instance._saved_group_id != instance.group_id:
+        counters.change(Group, instance._saved_group_id, posts_count=-1)
+    else:
+        return
+    counters.change(Group, instance.group_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    counters.change(Group, instance.group_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, created, **kwargs):
+    if not created and instance._saved_image != instance.image.name:
+        tasks.schedule_release(instance._saved_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    tasks.schedule_release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(Post, instance.post_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change(Post, instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, followers_count=1)
+        counters.change_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def sync_author_timelines(sender, instance, **kwargs):
+    # После сдвига счётчика: автор мог перейти через FEED_PULL_THRESHOLD.
+    tasks.sync_timelines([instance.author_id])
+
+
+@receiver(post_migrate)
+def sync_timelines_after_migrate(sender, using, **kwargs):
+    # Смена FEED_MODE или FEED_PULL_THRESHOLD при выкладке.
+    if (sender.name == 'posts'
+            and router.allow_migrate_model(using, UserCounters)):
+        tasks.sync_timelines()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def reset_post_fragments(sender, instance, **kwargs):
+    cache.bump(cache.INDEX)
+    cache.bump(cache.AUTHOR, instance.author_id)
+    cache.bump(cache.GROUP, instance.group_id)
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    if saved_group_id not in (None, instance.group_id):
+        cache.bump(cache.GROUP, saved_group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def reset_group_fragments(sender, instance, **kwargs):
+    cache.bump(cache.INDEX)
+    cache.bump(cache.GROUPS)
+    cache.bump(cache.GROUP, instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def reset_group_cards(sender, instance, **kwargs):
+    Post.objects.filter(group=instance).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_user_fragments(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    cache.bump(cache.INDEX)
+    cache.bump(cache.USERS)
+    cache.bump(cache.AUTHOR, instance.pk)
+    Post.objects.filter(author=instance).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def reset_follow_fragments(sender, instance, **kwargs):
+    cache.bump(cache.FOLLOW, instance.user_id)
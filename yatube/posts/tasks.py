@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from tasks.queue import task
+from . import thumbnails, timeline
+
+
+@task(priority=10)
+def generate_thumbnails(post_id):
+    thumbnails.generate_for_post(post_id)
+
+
+@task(batch_size=100)
+def release_images(names):
+    for name in names:
+        thumbnails.release(name)
+
+
+@task()
+def backfill_timeline(author_id):
+    timeline.backfill(author_id)
+
+
+def sync_timelines(author_ids=None):
+    """Сверяет раскладку авторов с FEED_MODE и ставит в очередь
+    дополнение лент для авторов, которых начали раскладывать."""
+    for author_id in timeline.sync(author_ids):
+        backfill_timeline.delay(author_id)
+
+
+def schedule_thumbnails(post):
+    """Ставит создание миниатюр поста в очередь в текущей транзакции."""
+    if post.image:
+        generate_thumbnails.delay(post.pk)
+
+
+def schedule_release(name):
+    """Ставит освобождение файла в очередь не раньше, чем через
+    MEDIA_RELEASE_GRACE секунд."""
+    if name:
+        release_images.delay(name, run_at=timezone.now() + timedelta(
+            seconds=settings.MEDIA_RELEASE_GRACE))
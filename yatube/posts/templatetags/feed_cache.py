@@ -0,0 +1,53 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.routers import cache_tag
+from posts.cache import follow_version, get_generation
+from posts.thumbnails import prefetch
+
+register = template.Library()
+
+
+@register.simple_tag
+def generation(scope, pk=None):
+    # Фрагменты, построенные по реплике, хранятся отдельно.
+    return f'{get_generation(scope, pk)}{cache_tag()}'
+
+
+@register.simple_tag
+def follow_generation(user_id):
+    return f'{follow_version(user_id)}{cache_tag()}'
+
+
+def card_key(post):
+    # pub_date отличает пост от другого с тем же pk после отката.
+    return 'posts:card:{}:{}:{}:{}'.format(
+        post.pk, post.pub_date.timestamp(), post.version, cache_tag())
+
+
+@register.simple_tag
+def post_cards(posts):
+    """HTML карточек постов страницы.
+
+    Все карточки читаются из кеша одним get_many, рендерятся только
+    промахи, и те сохраняются одним set_many. Миниатюры для промахов
+    ищутся в хранилище sorl тоже одним обращением.
+    """
+    posts = list(posts)
+    cards = cache.get_many([card_key(post) for post in posts])
+    prefetch([
+        post.image for post in posts
+        if card_key(post) not in cards and not post.image_variants
+    ], 'card')
+    missed = {
+        card_key(post): render_to_string(
+            'posts/includes/post_card.html', {'post': post})
+        for post in posts if card_key(post) not in cards
+    }
+    if missed:
+        cache.set_many(missed, settings.POST_CARD_TIMEOUT)
+        cards.update(missed)
+    return [mark_safe(cards[card_key(post)]) for post in posts]
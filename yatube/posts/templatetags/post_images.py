@@ -0,0 +1,35 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from posts import variants
+from posts.thumbnails import post_image
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, alias):
+    """{% post_thumbnail post.image "card" as im %} — готовая миниатюра
+    или оригинал, без обработки картинки на пути запроса."""
+    return post_image(image, alias)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """<picture> с srcset по сохранённому описанию вариантов поста.
+
+    Файловая система не проверяется; пока вариантов нет, выводится
+    миниатюра sorl или оригинал.
+    """
+    built = post.variants
+    if not built:
+        return {'image': post_image(post.image, 'card')}
+    sources = variants.srcsets(built)
+    img = variants.fallback(built)
+    return {
+        'sources': sources[:-1],
+        'srcset': sources[-1][1],
+        'src': default_storage.url(img['name']),
+        'width': img['width'],
+        'height': img['height'],
+    }
@@ -0,0 +1,97 @@
+import datetime
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..admin import IndexedDatesQuerySet
+from ..models import Comment, Group, Post, User
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='-')
+
+    def create_posts(self, count):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.admin, group=self.group)
+            for i in range(count))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_changelist_queries_do_not_grow(self):
+        """Число запросов списков постов и комментариев не зависит от
+        числа строк, полный COUNT(*) не выполняется."""
+        url = reverse('admin:posts_post_changelist')
+        self.create_posts(3)
+        few = self.changelist_queries(url)
+        self.create_posts(30)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.admin, text='Комментарий')
+            for post in Post.objects.all())
+        self.assertEqual(len(self.changelist_queries(url)), len(few))
+        self.assertContains(
+            self.client.get(url),
+            f'<option value="{self.group.pk}" selected>Группа</option>',
+            count=33, html=True)
+        comments = self.changelist_queries(
+            reverse('admin:posts_comment_changelist'))
+        self.assertLess(len(comments), 15)
+        for sql in few + comments:
+            self.assertNotIn('posts_group"."title" FROM', sql)
+
+    @override_settings(PAGINATOR_COUNT_THRESHOLD=5)
+    def test_result_count_estimated(self):
+        """Выше порога число строк оценивается, страница открывается."""
+        self.create_posts(20)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertGreater(response.context['cl'].result_count, 5)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_search_uses_fulltext_index(self):
+        """Поиск в админке идёт по FTS-индексу, а не LIKE."""
+        self.create_posts(3)
+        Post.objects.create(text='Редкое слово', author=self.admin)
+        queries = self.changelist_queries(
+            reverse('admin:posts_post_changelist') + '?q=редкое')
+        sql = ' '.join(queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist') + '?q=редкое')
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    def test_indexed_dates_match_distinct(self):
+        """dates() прыжками по индексу совпадает с обычным dates()."""
+        moments = [
+            datetime.datetime(2020, 1, 31, 23, 0),
+            datetime.datetime(2020, 2, 1, 10, 0),
+            datetime.datetime(2020, 2, 1, 12, 0),
+            datetime.datetime(2021, 12, 31, 23, 59),
+            datetime.datetime(2023, 6, 15, 0, 0),
+        ]
+        self.create_posts(len(moments))
+        for post, moment in zip(Post.objects.order_by('pk'), moments):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(moment))
+        indexed = IndexedDatesQuerySet(Post)
+        for kind in ('year', 'month', 'day'):
+            for order in ('ASC', 'DESC'):
+                with self.subTest(kind=kind, order=order):
+                    self.assertEqual(
+                        indexed.dates('pub_date', kind, order),
+                        list(Post.objects.dates('pub_date', kind, order)))
+        response = self.client.get(
+            reverse('admin:posts_post_changelist') + '?pub_date__year=2020')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,111 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from ..models import Comment, Follow, Group, Post, User, UserCounters
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug')
+        cls.group1 = Group.objects.create(
+            title='Другая группа', slug='test-slug1')
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Счётчики постов автора и группы следуют за постами."""
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        post.group = self.group1
+        post.save()
+        self.group.refresh_from_db()
+        self.group1.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.group1.posts_count, 1)
+
+        post.delete()
+        self.group1.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+        self.assertEqual(self.group1.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста следует за комментариями."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Коммент')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка двигают счётчики обоих пользователей."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        Follow.objects.all().delete()
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+
+    def test_delete_user(self):
+        """Удаление пользователя с постами и подписками не создаёт
+        заново его строку счётчиков, счётчики остальных сдвигаются."""
+        user = User.objects.create(username='deleted')
+        Post.objects.create(text='Пост', author=user, group=self.group)
+        Follow.objects.create(user=self.reader, author=user)
+        Follow.objects.create(user=user, author=self.reader)
+        pk = user.pk
+        user.delete()
+        connection.check_constraints()
+        self.assertFalse(UserCounters.objects.filter(user_id=pk).exists())
+        self.assertEqual(self.counters(self.reader).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_recount_command(self):
+        """recount чинит расхождения после bulk_create."""
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=self.author, group=self.group)
+             for i in range(3)])
+        UserCounters.objects.filter(user=self.author).delete()
+        call_command('recount', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 3)
+        self.assertEqual(self.group.posts_count, 3)
+
+
+class CountersCommitTests(TransactionTestCase):
+    def test_missing_row_recreated_after_commit(self):
+        """Пропавшая строка счётчиков создаётся пересчётом после коммита,
+        для удалённого пользователя — нет."""
+        author = User.objects.create(username='author')
+        UserCounters.objects.filter(user=author).delete()
+        Post.objects.create(text='Пост', author=author)
+        self.assertEqual(
+            UserCounters.objects.get(user=author).posts_count, 1)
+
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=author, author=reader)
+        UserCounters.objects.filter(user=author).delete()
+        pk = author.pk
+        author.delete()
+        connection.check_constraints()
+        self.assertFalse(UserCounters.objects.filter(user_id=pk).exists())
+        counters = UserCounters.objects.get(user=reader)
+        self.assertEqual(
+            (counters.followers_count, counters.following_count), (0, 0))
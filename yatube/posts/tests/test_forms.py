@@ -78,7 +78,8 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), posts_count + 1)
         self.assertEqual(post_latest.text, form_data['text'])
         self.assertEqual(post_latest.group.id, form_data['group'])
-        self.assertEqual(post_latest.image, 'posts/small.gif')
+        self.assertRegex(
+            post_latest.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
 
     def test_post_edit(self):
         """Редактирование поста прошло успешно."""
@@ -117,8 +118,25 @@ class PostFormTests(TestCase):
 
         self.assertEqual(
             response.context['post'].group.id, new_form_data['group'])
-        self.assertEqual(
-            response.context['post'].image, 'posts/small_new.gif')
+        self.assertNotEqual(response.context['post'].image, post.image)
+        self.assertRegex(
+            response.context['post'].image.name,
+            r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+
+    @override_settings(UPLOAD_MAX_BYTES=20)
+    def test_post_create_too_large_image(self):
+        """Картинка больше UPLOAD_MAX_BYTES не сохраняется, форма
+        сообщает о размере."""
+        posts_count = Post.objects.count()
+        uploaded = SimpleUploadedFile(
+            name='large.gif', content=b'x' * 100, content_type='image/gif')
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Тестовый пост', 'image': uploaded},
+        )
+        self.assertEqual(Post.objects.count(), posts_count)
+        errors = response.context['form'].errors.as_data()
+        self.assertEqual(errors['image'][0].code, 'file_too_large')
 
     def test_redirect_guest(self):
         """Проверяем редирект гостя и колличество постов"""
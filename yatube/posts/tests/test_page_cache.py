@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.page_cache import page_key
+from ..models import Post, User
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.url = reverse('posts:index')
+
+    def test_anonymous_page_cached(self):
+        """Повторный анонимный запрос отдаётся из кеша без запросов к БД."""
+        self.guest_client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Тестовый текст')
+
+    def test_authorized_bypass(self):
+        """Авторизованный пользователь кеш не использует."""
+        self.guest_client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        response = self.authorized_client.get(self.url)
+        self.assertIsNotNone(response.context)
+
+    def test_new_version_recomputed(self):
+        """Новый пост меняет версию страницы."""
+        self.guest_client.get(self.url)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        self.assertContains(self.guest_client.get(self.url), 'Свежий пост')
+
+    def test_stale_copy_while_locked(self):
+        """Пока страницу пересчитывает другой воркер, отдаётся старая
+        копия."""
+        self.guest_client.get(self.url)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        lock = f'{page_key(RequestFactory().get(self.url))}:lock'
+        cache.add(lock, 1)
+        self.addCleanup(cache.delete, lock)
+        self.assertNotContains(
+            self.guest_client.get(self.url), 'Свежий пост')
+
+    def test_stale_copy_keeps_its_etag(self):
+        """Старая копия уходит не под ETag текущей версии, и по её
+        ETag нельзя получить 304, когда страница пересчитана."""
+        self.guest_client.get(self.url)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        lock = f'{page_key(RequestFactory().get(self.url))}:lock'
+        cache.add(lock, 1)
+        stale = self.guest_client.get(self.url)
+        cache.delete(lock)
+        fresh = self.guest_client.get(self.url)
+        self.assertContains(fresh, 'Свежий пост')
+        self.assertNotEqual(stale['ETag'], fresh['ETag'])
+        response = self.guest_client.get(
+            self.url, HTTP_IF_NONE_MATCH=stale['ETag'])
+        self.assertContains(response, 'Свежий пост')
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_expired_page_recomputed(self):
+        """Истёкшая страница пересчитывается."""
+        self.guest_client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(self.url)
+        self.assertIsNotNone(response.context)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_not_modified(self):
+        """Совпавший ETag даёт 304 без рендера, новый пост — 200."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        etags = {}
+        for page in pages:
+            with self.subTest(page=page):
+                etag = etags[page] = self.guest_client.get(page)['ETag']
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+                self.assertNotEqual(
+                    self.authorized_client.get(page)['ETag'], etag)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page])
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag поста."""
+        page = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.authorized_client.get(page)['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Коммент'})
+        response = self.authorized_client.get(page, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
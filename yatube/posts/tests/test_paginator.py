@@ -1,8 +1,9 @@
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 
 from ..models import Post, Group, Follow, User
+from ..utils import CachedCountPaginator, estimate_count
 
 
 class PaginatorViewsTest(TestCase):
@@ -17,10 +18,6 @@ class PaginatorViewsTest(TestCase):
         self.authorized_client1.force_login(self.user1)
         self.group = Group.objects.create(title='Тестовая группа',
                                           slug='test_group')
-        self.follow = Follow.objects.create(
-            author=self.user,
-            user=self.user1
-        )
         bilk_post: list = []
         for i in range(settings.TEST_OF_POST):
             bilk_post.append(
@@ -28,6 +25,10 @@ class PaginatorViewsTest(TestCase):
                      group=self.group,
                      author=self.user))
         Post.objects.bulk_create(bilk_post)
+        self.follow = Follow.objects.create(
+            author=self.user,
+            user=self.user1
+        )
         self.pages: tuple = (reverse('posts:index'),
                              reverse('posts:profile',
                                      kwargs={'username': self.user.username}),
@@ -73,3 +74,103 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(count_posts1, settings.POSTS_PER_PAGE)
             self.assertEqual(
                 count_posts2, settings.TEST_OF_POST - settings.POSTS_PER_PAGE)
+
+    def test_cursor_navigation(self):
+        """Курсорная навигация проходит ленту без пропусков и повторов."""
+        page = reverse('posts:index')
+        response = self.guest_client.get(page)
+        first = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        self.assertIsNone(
+            response.context['page_obj'].paginator.previous_cursor)
+
+        response = self.guest_client.get(page, {'after': next_cursor})
+        second = list(response.context['page_obj'])
+        self.assertEqual(
+            len(second), settings.TEST_OF_POST - settings.POSTS_PER_PAGE)
+        self.assertIsNone(response.context['page_obj'].paginator.next_cursor)
+        self.assertEqual(
+            set(first + second), set(Post.objects.all()))
+
+        paginator = response.context['page_obj'].paginator
+        response = self.guest_client.get(
+            page, {'before': paginator.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), first)
+
+    def test_cursor_broken_token(self):
+        """Битый токен курсора отдаёт первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': 'не-токен'})
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_PER_PAGE)
+
+
+class CachedCountPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        for i in range(30):
+            Post.objects.create(text=f'Тестовый текст {i}', author=cls.user)
+
+    def test_page_window(self):
+        """Пагинатор отдаёт окно страниц с первой и последней."""
+        paginator = CachedCountPaginator(Post.objects.all(), 1)
+        self.assertEqual(
+            paginator.get_page_window(15, 2),
+            [1, None, 13, 14, 15, 16, 17, None, 30])
+        self.assertEqual(
+            paginator.get_page_window(2, 2), [1, 2, 3, 4, None, 30])
+        self.assertEqual(
+            paginator.get_page_window(4, 2), [1, 2, 3, 4, 5, 6, None, 30])
+
+    def test_count_cached_and_invalidated(self):
+        """Счётчик берётся из кеша и сбрасывается новым постом."""
+        posts = Post.objects.filter(author=self.user)
+        self.assertEqual(CachedCountPaginator(posts, 10).count, 30)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(posts, 10).count, 30)
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(CachedCountPaginator(posts, 10).count, 31)
+
+    def test_estimate_above_threshold(self):
+        """Выше порога счётчик оценивается, ниже — считается точно."""
+        self.assertEqual(estimate_count(Post.objects.none(), 10), 0)
+        self.assertEqual(estimate_count(Post.objects.all(), 100), 30)
+        self.assertAlmostEqual(
+            estimate_count(Post.objects.all(), 10), 30, delta=3)
+
+    @override_settings(PAGINATOR_COUNT_THRESHOLD=10)
+    def test_overestimated_count(self):
+        """При завышенной оценке номер последней страницы не показывается,
+        а страница за концом выборки заменяется настоящей последней."""
+        ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        Post.objects.filter(pk__in=ids[1:16]).delete()
+        paginator = CachedCountPaginator(Post.objects.order_by('-pk'), 5)
+        self.assertGreater(paginator.count, 15)
+        paginator.page(1)
+        self.assertNotIn(paginator.num_pages, paginator.page_window)
+        self.assertIsNone(paginator.page_window[-1])
+
+        page = paginator.page(5)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+        self.assertEqual(
+            CachedCountPaginator(Post.objects.order_by('-pk'), 5).count, 15)
+
+    @override_settings(PAGINATOR_COUNT_THRESHOLD=10)
+    def test_underestimated_count(self):
+        """Страницы за заниженной оценкой остаются доступны."""
+        ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        Post.objects.filter(pk__in=ids[15::2]).delete()
+        posts = Post.objects.order_by('-pk')
+        real = posts.count()
+        paginator = CachedCountPaginator(posts, 5)
+        self.assertLess(paginator.count, real)
+        self.assertGreater(paginator.count, 10)
+        page = paginator.get_page(paginator.num_pages + 1)
+        self.assertEqual(page.number, paginator.num_pages)
+        self.assertEqual(paginator.count, real)
+        self.assertEqual(list(page), list(posts[page.start_index() - 1:]))
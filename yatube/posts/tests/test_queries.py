@@ -0,0 +1,61 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.conf import settings
+
+from core.queries import QueryBudgetMixin, fingerprint, record_queries
+from ..models import Post, Group, Follow, Comment, User
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(settings.TEST_OF_POST):
+            author = User.objects.create_user(username=f'author{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                text=f'Тестовый текст {i}', author=author, group=cls.group)
+            cls.post = Post.objects.create(
+                text=f'Текст автора {i}', author=cls.user, group=cls.group)
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Коммент {i}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feeds_within_budget(self):
+        """Страницы укладываются в QUERY_BUDGETS и обходятся без N+1."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for page in pages:
+            for query in ({}, {'page': 2}):
+                with self.subTest(page=page, query=query):
+                    self.assertQueryBudget(self.client.get(page, query))
+
+    def test_n_plus_one_detected(self):
+        """Повтор одного запроса в цикле помечается как N+1."""
+        with record_queries('loop') as report:
+            for post in Post.objects.all()[:5]:
+                User.objects.get(pk=post.author_id)
+        self.assertEqual(len(report.repeated()), 1)
+        self.assertIn('N+1', report.problems()[0])
+
+    def test_fingerprint(self):
+        """Отпечаток не зависит от литералов и длины списка IN."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s) LIMIT 1'))
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b = 10"),
+            fingerprint("SELECT * FROM t WHERE a = 'it''s'  AND b = 7"))
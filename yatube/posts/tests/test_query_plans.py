@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.queries import explain, plan_problems
+from ..models import Comment, Follow, Group, Post, User
+from ..utils import encode_cursor
+
+
+class QueryPlanTests(TestCase):
+    """Каждый SELECT страниц идёт по индексам: без полного сканирования
+    таблиц и без сортировки во временном B-дереве."""
+    # Форма поста выводит выбор группы целиком.
+    allowed_tables = ('posts_group',)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(settings.TEST_OF_POST):
+            cls.post = Post.objects.create(
+                text=f'Текст {i}', author=cls.author, group=cls.group)
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Коммент {i}')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assertIndexedPlans(self, url, data=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, data).status_code, 200)
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            plan = explain(connection, sql)
+            problems = plan_problems(sql, plan, self.allowed_tables)
+            self.assertFalse(problems, f'{url} {data}\n{sql}\n{plan}')
+
+    def test_feeds(self):
+        """Ленты в режиме курсора и номеров страниц."""
+        cursor = encode_cursor(Post.objects.order_by('-pub_date', '-pk')[4])
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+        )
+        for page in pages:
+            for data in ({}, {'after': cursor}, {'before': cursor},
+                         {'page': 2}):
+                with self.subTest(page=page, data=data):
+                    self.assertIndexedPlans(page, data)
+
+    def test_post_pages(self):
+        """Пост с комментариями, правка поста и поиск."""
+        self.client.force_login(self.author)
+        for page, data in (
+            (reverse('posts:post_detail', args=[self.post.pk]), None),
+            (reverse('posts:post_edit', args=[self.post.pk]), None),
+            (reverse('posts:post_create'), None),
+            (reverse('posts:search'), {'q': 'текст'}),
+        ):
+            with self.subTest(page=page):
+                self.assertIndexedPlans(page, data)
+
+    def test_problems_detected(self):
+        """Проверка замечает полное сканирование и временную сортировку."""
+        sql = 'SELECT id FROM posts_post WHERE text = %s'
+        self.assertTrue(plan_problems(sql, explain(connection, sql, ['x'])))
+        sql = 'SELECT id FROM posts_post ORDER BY text LIMIT 10'
+        self.assertTrue(plan_problems(sql, explain(connection, sql)))
+        sql = 'SELECT id FROM posts_post ORDER BY pub_date DESC LIMIT 10'
+        self.assertFalse(plan_problems(sql, explain(connection, sql)))
@@ -0,0 +1,141 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.test import (
+    Client, SimpleTestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from core.middleware import STICKY_COOKIE
+from core.routers import (
+    PrimaryReplicaRouter, cache_tag, read_from_replicas,
+)
+
+from ..models import Comment, Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class RouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_outside_requests_use_primary(self):
+        """Вне read_from_replicas чтение идёт в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_go_to_replica_until_write(self):
+        """Чтение уходит на реплику, после записи — в основную базу."""
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+
+    def test_cache_tag(self):
+        """Ключи кешей меняются, только пока чтение идёт с реплики."""
+        self.assertEqual(cache_tag(), '')
+        with read_from_replicas():
+            self.assertEqual(cache_tag(), 'replica')
+            self.router.db_for_write(Post)
+            self.assertEqual(cache_tag(), '')
+        with read_from_replicas(allowed=False):
+            self.assertEqual(cache_tag(), '')
+
+    def test_no_replicas(self):
+        """Без реплик всё идёт в основную базу."""
+        with self.settings(DATABASE_REPLICAS=[]), read_from_replicas():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        """Миграции на реплики не применяются."""
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaViewsTests(TransactionTestCase):
+    """Реплика — файловая копия основной базы, которая не обновляется:
+    новое содержимое видно, только если страница читает из основной."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='auth')
+        self.post = Post.objects.create(text='Старый пост', author=self.user)
+        self.client = Client()
+        self.client.force_login(self.user)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        connection.connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = {
+            **settings.DATABASES['default'],
+            'NAME': path,
+            'OPTIONS': {'pragmas': {'auto_vacuum': None,
+                                    'journal_mode': 'DELETE',
+                                    'query_only': 1}},
+        }
+        self.addCleanup(self.remove_replica)
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections._connections.replica
+        del connections.databases['replica']
+
+    def expire(self):
+        self.client.cookies[STICKY_COOKIE] = '0'
+
+    def test_profile_after_post_create(self):
+        """После post_create профиль читается из основной базы и
+        показывает новый пост, по истечении окна — снова с реплики."""
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'},
+            follow=True)
+        self.assertContains(response, 'Новый пост')
+        self.assertIn(STICKY_COOKIE, self.client.cookies)
+        self.expire()
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Новый пост')
+
+    def test_anonymous_read_between_write_and_writer_read(self):
+        """Аноним, прочитавший профиль с отставшей реплики между записью
+        и чтением автора, не кладёт старую страницу в общие кеши."""
+        url = reverse('posts:profile', args=[self.user.username])
+        self.client.post(reverse('posts:post_create'), {'text': 'Новый пост'})
+        anonymous = Client()
+        response = anonymous.get(url)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertContains(self.client.get(url), 'Новый пост')
+        # Страница из кеша анонимов и её ETag — тоже по снимку реплики.
+        self.assertNotContains(anonymous.get(url), 'Новый пост')
+        self.assertEqual(
+            anonymous.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 304)
+
+    def test_post_detail_after_add_comment(self):
+        """После add_comment пост показывает новый комментарий."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Свежий комментарий'}, follow=True)
+        self.assertContains(response, 'Свежий комментарий')
+        self.assertEqual(Comment.objects.count(), 1)
+        self.expire()
+        self.assertNotContains(self.client.get(url), 'Свежий комментарий')
+
+    def test_replica_is_read_only(self):
+        """Запись в реплику невозможна."""
+        with self.assertRaises(OperationalError):
+            Post.objects.using('replica').filter(
+                pk=self.post.pk).update(text='Изменён')
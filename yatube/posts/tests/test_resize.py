@@ -0,0 +1,178 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+
+from .. import resize
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def png(width, height, color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ResizeEndpointTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = override_settings(RESIZE_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cache_dir = cache_dir
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('big.png', png(1000, 500)),
+        )
+        self.client = Client()
+
+    def url(self, width=320, extension='webp', post=None):
+        post = post or self.post
+        return resize.resized_url(
+            post.pk, post.image.name or '', width, extension)
+
+    def test_resized_with_http_caching(self):
+        """Картинка отдаётся нужной ширины и формата с долгим
+        Cache-Control и ETag, повторный запрос получает 304."""
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(
+            response['Cache-Control'], settings.RESIZE_CACHE_CONTROL)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (320, 160))
+        response = self.client.get(
+            self.url(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_replaced_image_gets_new_url(self):
+        """После замены картинки адрес другой, а старый перенаправляет
+        на новый: immutable-ответ старого адреса не устаревает."""
+        old_url = self.url()
+        self.post.image = SimpleUploadedFile('new.png', png(800, 800))
+        self.post.save()
+        new_url = self.url()
+        self.assertNotEqual(old_url, new_url)
+        response = self.client.get(old_url)
+        self.assertRedirects(response, new_url, fetch_redirect_response=False)
+        self.assertNotIn('immutable', response.get('Cache-Control', ''))
+        response = self.client.get(new_url)
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (320, 320))
+
+    def test_whitelist(self):
+        """Ширины и форматы вне белых списков и посты без картинки
+        дают 404."""
+        empty = Post.objects.create(text='Без картинки', author=self.user)
+        for url in (self.url(width=321), self.url(extension='bmp'),
+                    self.url(post=empty)):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_broken_source(self):
+        """Удалённый, битый или слишком большой исходник даёт 404,
+        а не 500."""
+        post = Post.objects.create(
+            text='Своя картинка', author=self.user,
+            image=SimpleUploadedFile('own.png', png(1000, 500, 'blue')))
+        url = self.url(post=post)
+        with override_settings(POST_IMAGE_MAX_PIXELS=100):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        with open(post.image.path, 'wb') as file:
+            file.write(b'not an image')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        os.remove(post.image.path)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_range(self):
+        """Range отдаёт часть файла, диапазон вне файла — 416."""
+        full = b''.join(self.client.get(self.url()).streaming_content)
+        response = self.client.get(self.url(), HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            response['Content-Range'], f'bytes 10-19/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[10:20])
+        response = self.client.get(self.url(), HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), full[-5:])
+        response = self.client.get(
+            self.url(), HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_least_recently_used_evicted(self):
+        """Кеш вытесняет давно не читавшийся вариант."""
+        name = self.post.image.name
+        _, first = resize.get(name, 320, 'WEBP', 'webp')
+        first.close()
+        size = len(resize.resize(name, 640, 'WEBP'))
+        with override_settings(RESIZE_CACHE_MAX_BYTES=size):
+            _, second = resize.get(name, 640, 'WEBP', 'webp')
+            second.close()
+        self.assertFalse(
+            os.path.exists(resize.variant_path(
+                resize.variant_key(name, 320, 'WEBP'), 'webp')))
+        self.assertTrue(
+            os.path.exists(resize.variant_path(
+                resize.variant_key(name, 640, 'WEBP'), 'webp')))
+
+    def test_miss_walks_cache_only_over_limit(self):
+        """Промах обходит каталог кеша, только когда счётчик размера
+        перерос предел или ещё не заведён."""
+        name = self.post.image.name
+        with mock.patch.object(resize.os, 'walk', wraps=os.walk) as walk:
+            resize.get(name, 320, 'WEBP', 'webp')[1].close()
+            self.assertEqual(walk.call_count, 1)
+            resize.get(name, 480, 'WEBP', 'webp')[1].close()
+            resize.get(name, 320, 'WEBP', 'webp')[1].close()
+            self.assertEqual(walk.call_count, 1)
+            with override_settings(RESIZE_CACHE_MAX_BYTES=1):
+                resize.get(name, 640, 'WEBP', 'webp')[1].close()
+            self.assertEqual(walk.call_count, 2)
+
+    def test_concurrent_requests_share_resize(self):
+        """Параллельные запросы одного варианта делают один ресайз."""
+        original = resize.resize
+
+        def slow_resize(*args):
+            time.sleep(0.1)
+            return original(*args)
+
+        files = []
+        with mock.patch.object(
+                resize, 'resize', side_effect=slow_resize) as patched:
+            threads = [
+                threading.Thread(target=lambda: files.append(resize.get(
+                    self.post.image.name, 480, 'JPEG', 'jpg')[1]))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        for file in files:
+            file.close()
+        self.assertEqual(len(files), 4)
+        self.assertEqual(patched.call_count, 1)
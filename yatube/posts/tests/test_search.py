@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Group, Post, User
+
+
+def indexed():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid, author, group_title FROM {search.TABLE}'
+                       f' ORDER BY rowid')
+        return cursor.fetchall()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='leo', first_name='Лев', last_name='Толстой')
+        self.group = Group.objects.create(
+            title='Классика', slug='classic', description='-')
+        self.client = Client()
+
+    def test_index_follows_posts(self):
+        """Индекс обновляется при создании, правке, bulk_create и
+        удалении постов, а также при переименовании автора и группы."""
+        post = Post.objects.create(
+            text='Все счастливые семьи', author=self.author, group=self.group)
+        Post.objects.bulk_create([Post(text='Война', author=self.author)])
+        self.assertEqual(len(indexed()), 2)
+        post.text = 'Мир'
+        post.save()
+        self.assertEqual([p.pk for p in search.search('мир')[0]], [post.pk])
+        self.assertEqual(search.search('семьи')[0], [])
+        self.author.username = 'tolstoy'
+        self.author.save()
+        self.group.title = 'Проза'
+        self.group.save()
+        self.assertEqual(indexed()[0][1:], ('tolstoy Лев Толстой', 'Проза'))
+        self.assertEqual([p.pk for p in search.search('проза')[0]], [post.pk])
+        post.delete()
+        self.assertEqual(len(indexed()), 1)
+
+    def test_ranked_prefix_search_with_snippet(self):
+        """Ранжирование bm25, последнее слово ищется как префикс,
+        совпадения подсвечены, а HTML из текста экранирован."""
+        rare = Post.objects.create(
+            text='<b>кот</b> и собака', author=self.author)
+        often = Post.objects.create(
+            text='кот кот кот котёнок', author=self.author)
+        posts, next_cursor = search.search('кот')
+        self.assertEqual([p.pk for p in posts], [often.pk, rare.pk])
+        self.assertIsNone(next_cursor)
+        self.assertIn('<mark>котёнок</mark>', posts[0].snippet)
+        self.assertIn('&lt;b&gt;<mark>кот</mark>&lt;/b&gt;', posts[1].snippet)
+        self.assertEqual([p.pk for p in search.search('котё')[0]], [often.pk])
+        self.assertCountEqual([p.pk for p in search.search('Толст')[0]],
+                              [often.pk, rare.pk])
+
+    def test_fts_syntax_in_query_is_ignored(self):
+        """Операторы FTS5 во вводе не ломают запрос."""
+        Post.objects.create(text='кот', author=self.author)
+        for query in ('"', 'кот OR', 'NEAR(кот', '*', 'text:кот'):
+            with self.subTest(query=query):
+                search.search(query)
+        self.assertEqual(search.search(''), ([], None))
+
+    def test_cursor_pages(self):
+        """Курсор проходит всю выдачу без повторов и пропусков."""
+        Post.objects.bulk_create(
+            Post(text='слово ' * (i % 3 + 1), author=self.author)
+            for i in range(7))
+        seen, cursor = [], None
+        while True:
+            posts, token = search.search('слово', after=cursor, limit=3)
+            seen += [p.pk for p in posts]
+            if token is None:
+                break
+            cursor = search.decode_cursor(token)
+        self.assertEqual(sorted(seen), sorted(
+            Post.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), 7)
+
+    def test_view(self):
+        """Страница поиска показывает найденные посты и ссылку дальше."""
+        for i in range(11):
+            Post.objects.create(text=f'Пост номер {i}', author=self.author)
+        response = self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertEqual(len(response.context['posts']), 10)
+        self.assertContains(response, '<mark>Пост</mark>')
+        self.assertTemplateUsed(response, 'posts/includes/post_card.html')
+        next_cursor = response.context['next_cursor']
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'пост', 'after': next_cursor})
+        self.assertEqual(len(response.context['posts']), 1)
+        self.assertIsNone(response.context['next_cursor'])
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(response.context['posts'], [])
+
+    def test_rebuild_command(self):
+        """Команда пересобирает индекс пачками и убирает лишние строки."""
+        Post.objects.bulk_create(
+            Post(text=f'текст {i}', author=self.author) for i in range(5))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+            cursor.execute(f'INSERT INTO {search.TABLE}(rowid, text) '
+                           f"VALUES (100000, 'мусор')")
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual([row[0] for row in indexed()], list(
+            Post.objects.order_by('pk').values_list('pk', flat=True)))
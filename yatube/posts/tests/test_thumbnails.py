@@ -0,0 +1,270 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from tasks import queue
+from tasks.models import Task
+from .. import tasks, thumbnails, variants
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def test_feed_does_not_generate_thumbnails(self):
+        """Лента без готовой миниатюры показывает оригинал и не
+        вызывает sorl."""
+        post = self.create_post()
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend'
+                        '._create_thumbnail') as create:
+            response = self.client.get(reverse('posts:index'))
+        create.assert_not_called()
+        self.assertContains(response, post.image.url)
+
+    def test_generated_thumbnail_is_found(self):
+        """После генерации вместо оригинала отдаётся миниатюра, а
+        карточка поста перерисовывается."""
+        post = self.create_post()
+        version = Post.objects.get(pk=post.pk).version
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image, 'card'))
+        thumbnails.generate_for_post(post.pk)
+        thumbnail = thumbnails.cached_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(thumbnail.x, 960)
+        self.assertEqual(Post.objects.get(pk=post.pk).version, version + 1)
+        self.assertEqual(
+            thumbnails.post_image(post.image, 'card').url, thumbnail.url)
+
+    def test_create_and_edit_schedule_generation(self):
+        """Создание поста и замена картинки ставят генерацию в очередь,
+        правка без картинки — нет."""
+        with mock.patch('posts.views.tasks.schedule_thumbnails') as schedule:
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile('new.gif', SMALL_GIF, 'image/gif'),
+            })
+            post = Post.objects.get(text='Новый пост')
+            schedule.assert_called_once_with(post)
+            self.client.post(
+                reverse('posts:post_edit', args=(post.pk,)),
+                {'text': 'Правка без картинки'})
+            self.assertEqual(schedule.call_count, 1)
+            self.client.post(reverse('posts:post_edit', args=(post.pk,)), {
+                'text': 'Правка с картинкой',
+                'image': SimpleUploadedFile(
+                    'other.gif', SMALL_GIF, 'image/gif'),
+            })
+            self.assertEqual(schedule.call_count, 2)
+
+    def test_generation_queued_with_post(self):
+        """Задача создаётся вместе с постом, воркер создаёт миниатюры,
+        повторная постановка той же задачи не дублирует её."""
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Новый пост',
+            'image': SimpleUploadedFile('new.gif', SMALL_GIF, 'image/gif'),
+        })
+        post = Post.objects.get(text='Новый пост')
+        task = Task.objects.get()
+        self.assertEqual(task.name, 'posts.tasks.generate_thumbnails')
+        tasks.schedule_thumbnails(post)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image, 'card'))
+        self.assertEqual(queue.drain(), 1)
+        self.assertIsNotNone(thumbnails.cached_thumbnail(post.image, 'card'))
+        self.assertFalse(Task.objects.exists())
+
+    def test_pregenerate_command(self):
+        """Команда создаёт миниатюры для уже загруженных картинок."""
+        posts = [self.create_post(f'old{i}.gif') for i in range(3)]
+        call_command('pregenerate_thumbnails', workers=0, stdout=mock.Mock())
+        for post in posts:
+            self.assertIsNotNone(
+                thumbnails.cached_thumbnail(post.image, 'card'))
+
+    def test_benchmark_keeps_shared_cache(self):
+        """Бенчмарк хранилищ чистит только свой временный кеш."""
+        cache.set('bench:kept', 1)
+        output = StringIO()
+        call_command('benchmark_thumbnails', runs=1, stdout=output)
+        self.assertIn('posts.kvstore', output.getvalue())
+        self.assertEqual(cache.get('bench:kept'), 1)
+        self.assertFalse(
+            User.objects.filter(username='bench_author').exists())
+
+    def test_thumbnail_lookups_batched_per_page(self):
+        """Миниатюры карточек страницы ищутся одним запросом, повторно
+        — из памяти процесса, пока их записи не меняются."""
+        # Байт после конца GIF делает файлы разными.
+        posts = [
+            self.create_post(f'page{i}.gif', SMALL_GIF + bytes([i]))
+            for i in range(5)
+        ]
+        thumbnails.generate_for_post(posts[0].pk)
+        Post.objects.update(image_variants='')
+        with self.assertNumQueries(1):
+            thumbnails.prefetch([post.image for post in posts], 'card')
+            for post in posts:
+                thumbnails.cached_thumbnail(post.image, 'card')
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(
+                thumbnails.cached_thumbnail(posts[0].image, 'card'))
+            self.assertIsNone(
+                thumbnails.cached_thumbnail(posts[1].image, 'card'))
+        thumbnails.generate_for_post(posts[1].pk)
+        self.assertIsNotNone(
+            thumbnails.cached_thumbnail(posts[1].image, 'card'))
+
+    def test_variants_built_in_all_widths(self):
+        """Фоновая задача сохраняет варианты во всех ширинах и
+        доступных форматах."""
+        post = self.create_post()
+        thumbnails.generate_for_post(post.pk)
+        built = Post.objects.get(pk=post.pk).variants
+        formats = variants.available_formats()
+        self.assertEqual(
+            len(built), len(settings.POST_IMAGE_WIDTHS) * len(formats))
+        self.assertEqual(
+            {variant['width'] for variant in built},
+            set(settings.POST_IMAGE_WIDTHS))
+        self.assertIn('WEBP', formats)
+        for variant in built:
+            self.assertEqual(
+                variant['height'], variant['width'] * 339 // 960)
+
+    def test_feed_renders_picture_from_variants(self):
+        """Карточка выводит <picture> с srcset из описания вариантов
+        без обращения к файлам."""
+        post = self.create_post()
+        thumbnails.generate_for_post(post.pk)
+        with mock.patch('django.core.files.storage.FileSystemStorage'
+                        '.exists') as exists:
+            response = self.client.get(reverse('posts:index'))
+        exists.assert_not_called()
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '480w')
+
+    def test_new_image_drops_old_variants(self):
+        """Замена картинки сбрасывает описание старых вариантов."""
+        post = self.create_post()
+        thumbnails.generate_for_post(post.pk)
+        post = Post.objects.get(pk=post.pk)
+        post.image = SimpleUploadedFile('new.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).variants, [])
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1)
+    def test_too_large_image_rejected(self):
+        """Картинка больше POST_IMAGE_MAX_PIXELS не декодируется."""
+        post = self.create_post()
+        with self.assertRaises(variants.ImageTooLarge):
+            variants.build(post.image.name)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_RELEASE_GRACE=0)
+class SharedImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, name):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_same_image_shared_with_thumbnails(self):
+        """Одинаковые картинки двух постов — один файл, миниатюры и
+        варианты второго поста не создаются заново."""
+        first = self.create_post('first.gif')
+        thumbnails.generate_for_post(first.pk)
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        with mock.patch('posts.variants.build') as build, \
+                mock.patch('sorl.thumbnail.base.ThumbnailBackend'
+                           '._create_thumbnail') as create:
+            thumbnails.generate_for_post(second.pk)
+        build.assert_not_called()
+        create.assert_not_called()
+        self.assertEqual(
+            Post.objects.get(pk=second.pk).variants,
+            Post.objects.get(pk=first.pk).variants)
+
+    def test_file_released_with_last_reference(self):
+        """Файл, миниатюры и варианты удаляются вместе с последним
+        ссылающимся постом."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        thumbnails.generate_for_post(first.pk)
+        storage = first.image.storage
+        name = first.image.name
+        thumbnail = thumbnails.cached_thumbnail(name, 'card')
+        built = Post.objects.get(pk=first.pk).variants
+        first.delete()
+        self.assertFalse(thumbnails.release(name))
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertTrue(thumbnails.release(name))
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(thumbnail.name))
+        self.assertFalse(storage.exists(built[0]['name']))
+        self.assertIsNone(thumbnails.cached_thumbnail(name, 'card'))
+
+    @override_settings(MEDIA_RELEASE_GRACE=60)
+    def test_recently_saved_file_kept(self):
+        """Только что сохранённый файл не удаляется: его может ждать
+        ещё не закоммиченный пост."""
+        post = self.create_post('first.gif')
+        name = post.image.name
+        post.delete()
+        self.assertFalse(thumbnails.release(name))
+        self.assertTrue(post.image.storage.exists(name))
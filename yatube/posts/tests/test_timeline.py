@@ -0,0 +1,139 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from tasks import queue
+from tasks.models import Task
+
+from .. import cache
+from ..models import Post, Follow, Timeline, User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.follower = User.objects.create(username='follower')
+
+    def feed(self):
+        return list(Timeline.objects.filter(
+            user=self.follower).values_list('post', flat=True))
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост попадает в ленту подписчика."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.feed(), [post.pk])
+
+    def test_follow_and_unfollow(self):
+        """Подписка заполняет ленту, отписка очищает."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.feed(), [post.pk])
+        Follow.objects.filter(
+            user=self.follower, author=self.author).delete()
+        self.assertEqual(self.feed(), [])
+
+    def test_deleted_post_leaves_timeline(self):
+        """Удалённый пост пропадает из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(text='Пост', author=self.author).delete()
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_trimmed(self):
+        """Лента обрезается до TIMELINE_LENGTH свежих постов."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(3)
+        ]
+        self.assertEqual(
+            sorted(self.feed()), sorted(post.pk for post in posts[1:]))
+
+    def test_rebuild_command(self):
+        """rebuild_timeline восстанавливает ленту из Follow и Post."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=self.author) for i in range(3)])
+        self.assertEqual(self.feed(), [])
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(len(self.feed()), 3)
+
+    def test_benchmark_leaves_no_traces(self):
+        """benchmark_feed не сдвигает поколения общего кеша, не ставит
+        задач и возвращает обработчики сигналов на место."""
+        generation = cache.get_generation(cache.INDEX)
+        output = StringIO()
+        call_command('benchmark_feed', followers=3, authors=2, posts=2,
+                     threshold=2, stdout=output)
+        self.assertIn('hybrid', output.getvalue())
+        self.assertEqual(cache.get_generation(cache.INDEX), generation)
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(User.objects.filter(
+            username__startswith='bench_').exists())
+        with mock.patch('posts.signals.tasks.sync_timelines') as sync:
+            Follow.objects.create(user=self.follower, author=self.author)
+        sync.assert_called_once_with([self.author.pk])
+
+    @override_settings(FEED_MODE='hybrid', FEED_PULL_THRESHOLD=1)
+    def test_author_below_threshold_backfilled(self):
+        """Когда у популярного автора становится меньше подписчиков,
+        его прежние посты дописываются в ленты оставшихся."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        other = Follow.objects.create(
+            user=User.objects.create(username='other'), author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.feed(), [])
+        other.delete()
+        self.assertEqual(queue.drain(), 1)
+        self.assertEqual(self.feed(), [post.pk])
+
+    def test_sync_after_feed_mode_change(self):
+        """sync_timeline после смены FEED_MODE дописывает ленты тех, кого
+        раньше читали при открытии."""
+        with self.settings(FEED_MODE='pull'):
+            Follow.objects.create(user=self.follower, author=self.author)
+            post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.feed(), [])
+        with self.settings(FEED_MODE='push'):
+            call_command('sync_timeline', stdout=StringIO())
+            self.assertEqual(self.feed(), [post.pk])
+            call_command('sync_timeline', stdout=StringIO())
+        self.assertEqual(self.feed(), [post.pk])
+
+    @override_settings(FEED_MODE='hybrid', FEED_PULL_THRESHOLD=1)
+    def test_hybrid_feed_merges_streams(self):
+        """Посты популярного автора читаются при открытии ленты."""
+        star = User.objects.create(username='star')
+        Follow.objects.create(user=self.author, author=star)
+        Follow.objects.create(user=self.follower, author=star)
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [
+            Post.objects.create(text='Пост звезды', author=star),
+            Post.objects.create(text='Пост автора', author=self.author),
+            Post.objects.create(text='Новый пост звезды', author=star),
+        ]
+        self.assertEqual(self.feed(), [posts[1].pk])
+        client = Client()
+        client.force_login(self.follower)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), posts[::-1])
+        response = client.get(reverse('posts:follow_index'), {'page': 1})
+        self.assertEqual(
+            list(response.context['page_obj']), posts[::-1])
+
+    @override_settings(FEED_MODE='pull')
+    def test_pull_feed_skips_timeline(self):
+        """В режиме pull лента читается без Timeline."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(self.feed(), [])
+        client = Client()
+        client.force_login(self.follower)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
@@ -5,11 +5,13 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
+from django.db.models import F
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from http import HTTPStatus
 
 from ..models import Post, Group, Follow, Comment, User
+from ..templatetags.feed_cache import post_cards
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -61,6 +63,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -213,14 +216,68 @@ class PostPagesTests(TestCase):
             author=self.user).exists())
 
     def test_index_page_cache(self):
-        """Посты в index хранятся в кэше, обновляются раз в 20 секунд"""
+        """Посты в index хранятся в кэше до изменения постов."""
         response_1 = self.authorized_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_2.content, response_3.content)
 
+    def test_feed_cache_invalidated_by_signals(self):
+        """Новый пост сразу виден в закешированных лентах."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for page in pages:
+            self.guest_client.get(page)
+        Post.objects.create(
+            text='Свежий пост', author=self.user, group=self.group)
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(self.guest_client.get(page), 'Свежий пост')
+        self.guest_client.get(pages[1])
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        for page in (pages[0], pages[2]):
+            with self.subTest(page=page):
+                self.assertContains(
+                    self.guest_client.get(page), 'Новое название')
+
+    def test_post_cards_cached_per_post(self):
+        """Карточка поста кешируется и сбрасывается правкой поста,
+        автора или группы."""
+        def card():
+            post = Post.objects.select_related('author', 'group').get(
+                pk=self.post.pk)
+            return post_cards([post])[0]
+
+        self.assertIn(self.group.title, card())
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        self.assertNotIn('Без сигнала', card())
+
+        post = Post.objects.get(pk=self.post.pk)
+        version = post.version
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertEqual(post.version, version + 1)
+        self.assertIn('Исправленный текст', card())
+        self.assertIn('Исправленный текст', post_cards([post])[0])
+
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Автор'
+        author.save()
+        self.assertIn('Автор', card())
+
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        group.save()
+        self.assertIn('Переименованная группа', card())
+
     def test_authorized_user_follow(self):
         """Проверка подписки юзера"""
         Follow.objects.count()
@@ -261,6 +318,33 @@ class PostPagesTests(TestCase):
         self.assertEqual(post_test, first_object)
         self.assertEqual(len(response.context['page_obj']), 2)
 
+    def test_follow_fragment_scoped_to_followed_authors(self):
+        """Фрагмент ленты подписок сбрасывают посты авторов, на которых
+        подписан пользователь, подписки и группы, но не чужие посты."""
+        url = reverse('posts:follow_index')
+        Follow.objects.create(user=self.user1, author=self.user)
+        self.authorized_client1.get(url)
+        # Новая версия без сигнала: новую карточку покажет только
+        # пересобранный фрагмент.
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Без сигнала', version=F('version') + 1)
+        stranger = User.objects.create(username='stranger')
+        Post.objects.create(text='Чужой пост', author=stranger)
+        self.assertNotContains(
+            self.authorized_client1.get(url), 'Без сигнала')
+
+        Follow.objects.create(user=self.user1, author=stranger)
+        self.assertContains(self.authorized_client1.get(url), 'Чужой пост')
+
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(
+            self.authorized_client1.get(url), 'Новое название')
+
+        Post.objects.create(text='Свежий пост', author=self.user)
+        self.assertContains(self.authorized_client1.get(url), 'Свежий пост')
+
     def test_not_following_page(self):
         """Пост отсутствует у тех, кто не подписан."""
         response1 = self.authorized_client1.get(reverse(
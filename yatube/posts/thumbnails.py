@@ -0,0 +1,122 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import F
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import cache, variants
+from .models import Post
+
+
+def thumbnail_options(alias):
+    """Геометрия и полный набор опций sorl для размера alias.
+
+    Опции дополняются так же, как в ThumbnailBackend.get_thumbnail,
+    иначе имя файла миниатюры не совпадёт с тем, что создаст sorl.
+    """
+    geometry, options = settings.POST_THUMBNAILS[alias]
+    options = dict(options)
+    backend = default.backend
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return geometry, options
+
+
+def thumbnail_file(image, alias):
+    """ImageFile миниатюры размера alias; файл не читается."""
+    geometry, options = thumbnail_options(alias)
+    # По имени, как в generate: ключ sorl зависит и от хранилища.
+    source = ImageFile(getattr(image, 'name', image))
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options['format'] = default.backend._get_format(source)
+    name = default.backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnail(image, alias):
+    """Готовая миниатюра из хранилища sorl или None.
+
+    Только поиск: файл не читается и не создаётся.
+    """
+    return default.kvstore.get(thumbnail_file(image, alias))
+
+
+def prefetch(images, alias):
+    """Читает записи миниатюр всех images одним обращением, если
+    хранилище sorl это умеет (posts.kvstore.KVStore)."""
+    kvstore = default.kvstore
+    if hasattr(kvstore, 'prefetch'):
+        kvstore.prefetch(
+            [thumbnail_file(image, alias) for image in images if image])
+
+
+def generate(image):
+    """Создаёт миниатюры картинки во всех размерах POST_THUMBNAILS."""
+    for geometry, options in settings.POST_THUMBNAILS.values():
+        get_thumbnail(image, geometry, **options)
+
+
+def refresh(posts):
+    """Сбрасывает закешированные карточки и ленты с постами posts,
+    чтобы вместо оригинала в них попала готовая миниатюра."""
+    rows = list(posts.values_list('pk', 'author_id', 'group_id'))
+    Post.objects.filter(
+        pk__in=[pk for pk, _, _ in rows]).update(version=F('version') + 1)
+    cache.bump(cache.INDEX)
+    for author_id in {author_id for _, author_id, _ in rows}:
+        cache.bump(cache.AUTHOR, author_id)
+    for group_id in {group_id for _, _, group_id in rows}:
+        cache.bump(cache.GROUP, group_id)
+
+
+def generate_for_post(post_id):
+    """Создаёт миниатюры и варианты картинки поста (задача
+    posts.tasks.generate_thumbnails)."""
+    posts = Post.objects.filter(pk=post_id).exclude(image='')
+    for image in posts.values_list('image', flat=True):
+        generate(image)
+        variants.build_for_post(post_id)
+        refresh(posts)
+
+
+def post_image(image, alias):
+    """Миниатюра для шаблона без создания на пути запроса.
+
+    Пока миниатюры нет (задача в очереди не выполнена или старый пост ещё
+    не обработан pregenerate_thumbnails), шаблон получает оригинал.
+    """
+    if not image:
+        return None
+    return cached_thumbnail(image, alias) or image
+
+
+def release(name):
+    """Удаляет файл картинки, его миниатюры и варианты, если на него
+    больше не ссылается ни один пост.
+
+    Файл, который сохраняли меньше MEDIA_RELEASE_GRACE секунд назад,
+    не трогается: его может использовать ещё не закоммиченный пост.
+    """
+    storage = Post._meta.get_field('image').storage
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    try:
+        if not storage.exists(name):
+            return False
+    except SuspiciousFileOperation:
+        # Путь вне MEDIA_ROOT — файл не наш.
+        return False
+    modified = storage.get_modified_time(name).timestamp()
+    if time.time() - modified < settings.MEDIA_RELEASE_GRACE:
+        return False
+    delete(name)
+    variants.delete(name)
+    return True
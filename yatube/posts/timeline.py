@@ -0,0 +1,168 @@
+from django.conf import settings
+from django.db.models import Count, F, Q
+
+from .models import Follow, Post, Timeline, UserCounters
+
+PUSH = 'push'
+PULL = 'pull'
+HYBRID = 'hybrid'
+
+
+def is_pushed(author_id):
+    """Раскладывается ли автор по лентам при записи (FEED_MODE)."""
+    if settings.FEED_MODE == PULL:
+        return False
+    if settings.FEED_MODE == PUSH:
+        return True
+    followers = UserCounters.objects.filter(
+        user_id=author_id).values_list('followers_count', flat=True).first()
+    return (followers or 0) <= settings.FEED_PULL_THRESHOLD
+
+
+def pushed_counters():
+    """Счётчики авторов, которых по FEED_MODE раскладывают по лентам."""
+    if settings.FEED_MODE == PULL:
+        return UserCounters.objects.none()
+    if settings.FEED_MODE == PUSH:
+        return UserCounters.objects.all()
+    return UserCounters.objects.filter(
+        followers_count__lte=settings.FEED_PULL_THRESHOLD)
+
+
+def pulled_authors(user):
+    """Авторы из подписок, чьи посты читаются при открытии ленты."""
+    follows = Follow.objects.filter(user=user)
+    if settings.FEED_MODE == PUSH:
+        return []
+    if settings.FEED_MODE == PULL:
+        return list(follows.values_list('author_id', flat=True))
+    return list(follows.filter(
+        author__counters__followers_count__gt=settings.FEED_PULL_THRESHOLD
+    ).values_list('author_id', flat=True))
+
+
+def feed(user):
+    """Лента подписок: общий queryset и потоки для слияния.
+
+    Посты из Timeline и посты авторов, читаемых при открытии ленты,
+    идут отдельными потоками; queryset нужен для ?page=N.
+    """
+    feed_posts = Post.objects.select_related('author', 'group')
+    if settings.FEED_MODE == PULL:
+        posts = feed_posts.filter(author__following__user=user)
+        return posts, [posts]
+    # Курсор по полям самой Timeline: так ленту отдаёт индекс
+    # timeline_user_pub_date, без сортировки постов.
+    pushed = feed_posts.filter(timeline_entries__user=user).annotate(
+        cursor_date=F('timeline_entries__pub_date'),
+        cursor_id=F('timeline_entries__post'))
+    authors = pulled_authors(user)
+    if not authors:
+        return pushed, [pushed]
+    pulled = feed_posts.filter(author_id__in=authors)
+    posts = feed_posts.filter(
+        Q(pk__in=Timeline.objects.filter(user=user).values('post'))
+        | Q(author_id__in=authors))
+    return posts, [pushed, pulled]
+
+
+def trim(user_ids):
+    """Оставляет в лентах только TIMELINE_LENGTH свежих записей."""
+    overflowed = Timeline.objects.filter(
+        user_id__in=user_ids
+    ).order_by().values('user').annotate(
+        entries=Count('pk')
+    ).filter(
+        entries__gt=settings.TIMELINE_LENGTH
+    ).values_list('user', flat=True)
+    for user_id in overflowed:
+        keep = Timeline.objects.filter(user_id=user_id).order_by(
+            '-pub_date', '-post').values('pk')[:settings.TIMELINE_LENGTH]
+        Timeline.objects.filter(user_id=user_id).exclude(
+            pk__in=keep).delete()
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_pushed(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    Timeline.objects.bulk_create(
+        [Timeline(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers],
+        ignore_conflicts=True,
+    )
+    trim(followers)
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if not is_pushed(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    Timeline.objects.bulk_create(
+        [Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    Timeline.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def backfill(author_id):
+    """Добавляет последние посты автора в ленты всех его подписчиков:
+    пока автора читали при открытии ленты, их там не было."""
+    if not is_pushed(author_id):
+        return
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_LENGTH])
+    followers = list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+    Timeline.objects.bulk_create(
+        (Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for user_id in followers for pk, pub_date in posts),
+        batch_size=settings.TIMELINE_BACKFILL_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(followers)
+
+
+def sync(author_ids=None):
+    """Сверяет UserCounters.feed_pushed с FEED_MODE и
+    FEED_PULL_THRESHOLD.
+
+    Возвращает id авторов, которых раньше читали при открытии ленты, а
+    теперь раскладывают: их старые посты нужно добавить в ленты
+    (backfill). Непроверенные (None) только отмечаются: ленты считаются
+    собранными по текущим настройкам.
+    """
+    counters = UserCounters.objects.all()
+    if author_ids is not None:
+        counters = counters.filter(user_id__in=author_ids)
+    pushed = counters.filter(pk__in=pushed_counters().values('pk'))
+    moved = list(pushed.filter(feed_pushed=False).values_list(
+        'user_id', flat=True))
+    pushed.exclude(feed_pushed=True).update(feed_pushed=True)
+    counters.exclude(pk__in=pushed_counters().values('pk')).exclude(
+        feed_pushed=False).update(feed_pushed=False)
+    return moved
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты из Follow и Post."""
+    sync()
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        Timeline.objects.filter(user_id__in=user_ids).delete()
+    else:
+        Timeline.objects.all().delete()
+    for user_id, author_id in follows.values_list('user_id', 'author_id'):
+        add_author(user_id, author_id)
@@ -6,11 +6,16 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path("create/", views.post_create, name="post_create"),
     path('posts/<int:post_id>/edit/', views.post_edit, name="post_edit"),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/image/<str:digest>/<int:width>.<str:extension>',
+        views.post_image_resized,
+        name='post_image_resized'),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
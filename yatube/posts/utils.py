@@ -1,9 +1,244 @@
-from django.core.paginator import Paginator
+import hashlib
+import heapq
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
 from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils.encoding import force_bytes, force_text
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.routers import cache_tag
+
+
+def encode_cursor(post):
+    """Непрозрачный токен позиции поста в ленте: (pub_date, id)."""
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора. Для битого токена возвращает None."""
+    try:
+        pub_date, pk = force_text(urlsafe_base64_decode(token)).split('|')
+        return datetime.fromisoformat(pub_date), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def cursor_fields(posts):
+    """Поля, по которым поток сортируется и режется курсором.
+
+    По умолчанию это (pub_date, pk) поста. Поток может задать свои
+    аннотациями cursor_date и cursor_id с теми же значениями, но из
+    таблицы, где для них есть индекс, — например, из Timeline.
+    """
+    if 'cursor_date' in posts.query.annotations:
+        return 'cursor_date', 'cursor_id'
+    return 'pub_date', 'pk'
+
+
+COUNT_GENERATION_KEY = 'posts:count_generation'
+
+
+def invalidate_counts():
+    """Сбрасывает все закешированные счётчики пагинатора."""
+    try:
+        cache.incr(COUNT_GENERATION_KEY)
+    except ValueError:
+        cache.set(COUNT_GENERATION_KEY, 1, None)
+
+
+def estimate_count(posts, threshold):
+    """Точный COUNT до threshold, выше — оценка по плотности id.
+
+    Плотность берётся по threshold самым свежим записям выборки и
+    распространяется на весь диапазон id, так что оба запроса идут
+    по индексу и не зависят от размера таблицы.
+    """
+    posts = posts.order_by()
+    _, id_field = cursor_fields(posts)
+    pivot = posts.order_by(f'-{id_field}').values_list(id_field, flat=True)[
+        threshold:threshold + 1]
+    if not pivot:
+        # Строк не больше threshold: считаем их по тому же индексу.
+        return posts.order_by(f'-{id_field}').values_list(
+            id_field)[:threshold].count()
+    bounds = posts.aggregate(low=Min(id_field), high=Max(id_field))
+    density = threshold / max(bounds['high'] - pivot[0], 1)
+    return max(int(density * (bounds['high'] - bounds['low'] + 1)),
+               threshold + 1)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator с закешированным и приблизительным count.
+
+    Счётчик хранится в кеше по ключу запроса и поколению, которое
+    сбрасывается при сохранении и удалении Post. page_window — окно
+    номеров вокруг текущей страницы с первой и последней, None на
+    месте пропуска. Пока count оценочный, номер последней страницы
+    не показывается. Если оценка разошлась с выборкой — страница за
+    оценкой запрошена или страница до неё пуста, — строки один раз
+    считаются точно (counted).
+    """
+    page_window = ()
+    counted = False
+
+    @cached_property
+    def count_key(self):
+        query = str(self.object_list.query).encode()
+        return 'posts:count:{}:{}:{}'.format(
+            cache.get(COUNT_GENERATION_KEY, 0),
+            hashlib.md5(query).hexdigest(), cache_tag())
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.count_key)
+        if count is None:
+            count = estimate_count(
+                self.object_list, settings.PAGINATOR_COUNT_THRESHOLD)
+            cache.set(self.count_key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    @property
+    def estimated(self):
+        return (not self.counted
+                and self.count > settings.PAGINATOR_COUNT_THRESHOLD)
+
+    def recount(self):
+        """Точный COUNT вместо оценки, в том числе в кеше."""
+        self.count = self.object_list.count()
+        self.counted = True
+        self.__dict__.pop('num_pages', None)
+        cache.set(self.count_key, self.count,
+                  settings.PAGINATOR_COUNT_TIMEOUT)
+
+    def get_page_window(self, number, on_each_side=None):
+        if on_each_side is None:
+            on_each_side = settings.PAGINATOR_WINDOW
+        low = max(number - on_each_side, 1)
+        high = min(number + on_each_side, self.num_pages)
+        window = list(range(low, high + 1))
+        if low > 1:
+            window[:0] = [1] if low == 2 else [1, None]
+        if high < self.num_pages:
+            window += ([None] if self.estimated
+                       else [self.num_pages] if high == self.num_pages - 1
+                       else [None, self.num_pages])
+        return window
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Оценка меньше выборки: страница за ней может быть настоящей.
+            if not self.estimated or int(number) <= 1:
+                raise
+            self.recount()
+            return super().validate_number(number)
+
+    def page(self, number):
+        page = super().page(number)
+        if page.number > 1 and not page.object_list and not self.counted:
+            # Оценка больше выборки: номер сверяется с точным счётом.
+            self.recount()
+            page = super().page(min(page.number, self.num_pages))
+        self.page_window = self.get_page_window(page.number)
+        return page
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки: count через estimate_count, без кеша —
+    списки там фильтруются по-разному, а точность не нужна."""
+
+    @cached_property
+    def count(self):
+        return estimate_count(
+            self.object_list, settings.PAGINATOR_COUNT_THRESHOLD)
+
+
+def cursor_key(post):
+    return post.pub_date, post.pk
+
+
+class CursorPaginator(CachedCountPaginator):
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Страница курсора — обычный Page, навигация по ней идёт через
+    next_cursor и previous_cursor самого пагинатора. Если передано
+    несколько потоков (streams), каждый читается отдельным запросом
+    с тем же курсором, а результаты сливаются по pub_date.
+    """
+    cursor_mode = False
+    next_cursor = None
+    previous_cursor = None
+
+    def __init__(self, object_list, per_page, streams=None, **kwargs):
+        super().__init__(
+            object_list.order_by(
+                *(f'-{field}' for field in cursor_fields(object_list))),
+            per_page, **kwargs)
+        self.streams = [
+            stream.order_by(*(f'-{field}' for field in cursor_fields(stream)))
+            for stream in streams
+        ] if streams else [self.object_list]
+
+    def fetch(self, posts, after=None, before=None):
+        date_field, id_field = cursor_fields(posts)
+        if before is not None:
+            pub_date, pk = before
+            posts = posts.filter(
+                Q(**{f'{date_field}__gt': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__gt': pk})
+            ).order_by(date_field, id_field)
+        elif after is not None:
+            pub_date, pk = after
+            posts = posts.filter(
+                Q(**{f'{date_field}__lt': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__lt': pk}))
+        return list(posts[:self.per_page + 1])
+
+    def merge(self, after=None, before=None):
+        if len(self.streams) == 1:
+            return self.fetch(self.streams[0], after, before)
+        rows, seen = [], set()
+        for post in heapq.merge(
+                *(self.fetch(stream, after, before)
+                  for stream in self.streams),
+                key=cursor_key, reverse=before is None):
+            if post.pk not in seen:
+                seen.add(post.pk)
+                rows.append(post)
+        return rows[:self.per_page + 1]
+
+    def get_cursor_page(self, after=None, before=None):
+        self.cursor_mode = True
+        rows = self.merge(after, before)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before is not None:
+            if not has_more:
+                return self.get_cursor_page()
+            rows.reverse()
+            has_newer, has_older = has_more, True
+        else:
+            has_newer, has_older = after is not None, has_more
+        if rows and has_newer:
+            self.previous_cursor = encode_cursor(rows[0])
+        if rows and has_older:
+            self.next_cursor = encode_cursor(rows[-1])
+        return Page(rows, 1, self)
 
 
-def split_by_page(request, post):
-    paginatir = Paginator(post, settings.POSTS_PER_PAGE)
+def split_by_page(request, post, streams=None):
+    paginatir = CursorPaginator(post, settings.POSTS_PER_PAGE, streams)
     page_namber = request.GET.get('page')
+    if page_namber is not None:
+        return paginatir.get_page(page_namber)
 
-    return paginatir.get_page(page_namber)
+    return paginatir.get_cursor_page(
+        after=decode_cursor(request.GET.get('after', '')),
+        before=decode_cursor(request.GET.get('before', '')),
+    )
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Post
+
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def available_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def variant_dir(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    digest = hashlib.md5(name.encode()).hexdigest()[:8]
+    return f'posts/variants/{stem}-{digest}'
+
+
+def open_fitted(name, width, height):
+    """Открывает картинку и обрезает её по центру до width x height.
+
+    Размер проверяется по заголовку до декодирования, а JPEG
+    декодируется сразу в уменьшенном масштабе (draft), так что в памяти
+    не бывает больше одного кадра чуть крупнее нужного.
+    """
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ImageTooLarge(
+                f'{name}: {image.width}x{image.height} слишком большая')
+        image.draft('RGB', (width, height))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info
+                                  else 'RGB')
+        return ImageOps.fit(image, (width, height), Image.LANCZOS)
+
+
+def encode(image, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format,
+               quality=settings.POST_IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def build(name):
+    """Сохраняет варианты картинки name во всех ширинах и форматах.
+
+    Возвращает их описание: формат, MIME-тип, размеры и имя файла.
+    """
+    widths = sorted(settings.POST_IMAGE_WIDTHS, reverse=True)
+    ratio_w, ratio_h = settings.POST_IMAGE_RATIO
+    largest = open_fitted(name, widths[0], widths[0] * ratio_h // ratio_w)
+    directory = variant_dir(name)
+    variants = []
+    for width in widths:
+        image = largest.resize(
+            (width, width * ratio_h // ratio_w), Image.LANCZOS)
+        for image_format in available_formats():
+            extension = image_format.lower().replace('jpeg', 'jpg')
+            path = f'{directory}/{width}.{extension}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            path = default_storage.save(
+                path, ContentFile(encode(image, image_format)))
+            variants.append({
+                'format': image_format,
+                'type': MIME_TYPES[image_format],
+                'width': image.width,
+                'height': image.height,
+                'name': path,
+            })
+    return variants
+
+
+def delete(name):
+    """Удаляет файлы вариантов картинки name."""
+    directory = variant_dir(name)
+    if default_storage.exists(directory):
+        for filename in default_storage.listdir(directory)[1]:
+            default_storage.delete(f'{directory}/{filename}')
+
+
+def build_for_post(post_id):
+    """Строит варианты картинки поста и сохраняет их описание в пост.
+
+    Если у другого поста с тем же файлом варианты уже есть, они
+    переиспользуются. Если картинку успели заменить, пока шла
+    обработка, результат не записывается.
+    """
+    image = Post.objects.filter(pk=post_id).exclude(
+        image='').values_list('image', flat=True).first()
+    if image is None:
+        return
+    built = Post.objects.filter(image=image).exclude(
+        image_variants='').values_list('image_variants', flat=True).first()
+    Post.objects.filter(pk=post_id, image=image).update(
+        image_variants=built or json.dumps(build(image)))
+
+
+def srcsets(variants):
+    """Группирует варианты по формату: [(MIME-тип, srcset), ...] в
+    порядке POST_IMAGE_FORMATS, самый совместимый последним."""
+    grouped = {}
+    for variant in sorted(variants, key=lambda variant: variant['width']):
+        grouped.setdefault(variant['format'], []).append('{} {}w'.format(
+            default_storage.url(variant['name']), variant['width']))
+    return [
+        (MIME_TYPES[image_format], ', '.join(grouped[image_format]))
+        for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in grouped
+    ]
+
+
+def fallback(variants):
+    """Вариант для <img src>: самый совместимый формат с шириной,
+    ближайшей к ширине кадра карточки."""
+    image_format = [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if any(variant['format'] == image_format for variant in variants)
+    ][-1]
+    return min(
+        (variant for variant in variants
+         if variant['format'] == image_format),
+        key=lambda variant: abs(
+            variant['width'] - settings.POST_IMAGE_RATIO[0]))
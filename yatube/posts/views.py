@@ -1,13 +1,27 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, render, redirect, render
+from django.views.decorators.http import condition, require_safe
+from PIL import Image
 
+from core.page_cache import cache_anonymous_page
+from . import resize, search as post_search, tasks, timeline
+from .cache import page_etag, page_version, post_etag
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Follow, User
 from .utils import split_by_page
+from .variants import MIME_TYPES, ImageTooLarge
 
 
+@condition(etag_func=page_etag)
+@cache_anonymous_page(page_version)
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.select_related('author', 'group')
     page_obj = split_by_page(request, posts)
 
     context = {
@@ -16,10 +30,12 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=page_etag)
+@cache_anonymous_page(page_version)
 def group_posts(request, slug):
 
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.select_related('author')
     page_obj = split_by_page(request, posts)
 
     context = {
@@ -29,9 +45,27 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@require_safe
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = post_search.search(
+        query, after=post_search.decode_cursor(request.GET.get('after', '')))
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'is_continued': 'after' in request.GET,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@condition(etag_func=post_etag)
+@cache_anonymous_page(page_version)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related('author')
+    post = get_object_or_404(
+        Post.objects.select_related('group', 'author__counters'), pk=post_id)
+    comments = post.comments.select_related('author').order_by(
+        'created', 'pk')
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -41,9 +75,12 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@condition(etag_func=page_etag)
+@cache_anonymous_page(page_version)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    post = author.posts.select_related('group')
     page_obj = split_by_page(request, post)
     following = request.user.is_authenticated and author.following.filter(
         user=request.user).exists()
@@ -56,17 +93,20 @@ def profile(request, username):
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        tasks.schedule_thumbnails(post)
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related('group', 'author'), id=post_id)
@@ -78,6 +118,8 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post.pk)
     if form.is_valid():
         post.save()
+        if 'image' in form.changed_data:
+            tasks.schedule_thumbnails(post)
         return redirect('posts:post_detail', post.pk)
     context = {
         'form': form,
@@ -88,6 +130,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(
         Post.objects.select_related('group', 'author'), id=post_id)
@@ -102,14 +145,15 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    author_posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = split_by_page(request, author_posts)
+    author_posts, streams = timeline.feed(request.user)
+    page_obj = split_by_page(request, author_posts, streams)
     return render(
         request, 'posts/follow.html', {'page_obj': page_obj}
     )
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     follow_user = get_object_or_404(User, username=username)
     if request.user != follow_user:
@@ -118,7 +162,68 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     unfollow_user = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=unfollow_user).delete()
     return redirect('posts:profile', username=username)
+
+
+def resized_source(request, post_id, width, extension):
+    """Имя картинки и формат для ресайза; 404 вне белых списков.
+
+    Запоминается в request, чтобы ETag и сам ответ обошлись одним
+    запросом к БД.
+    """
+    if not hasattr(request, 'resized_source'):
+        image_format = resize.formats().get(extension)
+        if width not in settings.RESIZE_WIDTHS or image_format is None:
+            raise Http404
+        name = Post.objects.filter(pk=post_id).exclude(
+            image='').values_list('image', flat=True).first()
+        if name is None:
+            raise Http404
+        request.resized_source = name, image_format
+    return request.resized_source
+
+
+def resized_image_etag(request, post_id, digest, width, extension):
+    name, image_format = resized_source(request, post_id, width, extension)
+    if digest != resize.image_digest(name):
+        return None
+    return resize.variant_key(name, width, image_format)
+
+
+@require_safe
+@condition(etag_func=resized_image_etag)
+def post_image_resized(request, post_id, digest, width, extension):
+    name, image_format = resized_source(request, post_id, width, extension)
+    if digest != resize.image_digest(name):
+        # Картинку заменили: старый адрес ведёт на новый без долгого
+        # кеширования.
+        return redirect(resize.resized_url(post_id, name, width, extension))
+    try:
+        _, file = resize.get(name, width, image_format, extension)
+    except (OSError, Image.DecompressionBombError, ImageTooLarge):
+        # Исходника нет на диске, он не читается или слишком большой.
+        raise Http404
+    size = os.fstat(file.fileno()).st_size
+    try:
+        requested = resize.byte_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if requested is None:
+        response = FileResponse(file, content_type=MIME_TYPES[image_format])
+    else:
+        start, end = requested
+        response = StreamingHttpResponse(
+            resize.read_range(file, start, end), status=206,
+            content_type=MIME_TYPES[image_format])
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = settings.RESIZE_CACHE_CONTROL
+    return response
@@ -0,0 +1,38 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks import queue
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='выполнить всё, что готово сейчас, и выйти',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=settings.TASKS_POLL_INTERVAL,
+            help='пауза между опросами пустой очереди, с',
+        )
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        if options['once']:
+            count = queue.drain(worker)
+            self.stdout.write(self.style.SUCCESS(f'Выполнено партий: {count}'))
+            return
+        self.stdout.write(f'Воркер {worker} запущен')
+        try:
+            while True:
+                close_old_connections()
+                if not queue.run_next(worker):
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Воркер остановлен')
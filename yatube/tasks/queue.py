@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class TaskSpec:
+    """Зарегистрированная задача: функция и её параметры очереди."""
+
+    def __init__(self, func, name, priority, max_attempts, batch_size):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, run_at=None, priority=None, **kwargs):
+        """Ставит задачу в очередь в текущей транзакции."""
+        return enqueue(self, args, kwargs, run_at=run_at, priority=priority)
+
+
+def task(name=None, priority=0, max_attempts=5, batch_size=1):
+    """Регистрирует функцию как фоновую задачу.
+
+    При batch_size > 1 у функции один аргумент — список: воркер
+    собирает до batch_size задач с одним именем и вызывает функцию
+    один раз со списком их аргументов.
+    """
+    def decorator(func):
+        spec = TaskSpec(
+            func, name or f'{func.__module__}.{func.__name__}',
+            priority, max_attempts, batch_size)
+        registry[spec.name] = spec
+        return spec
+    return decorator
+
+
+def enqueue(spec, args, kwargs, run_at=None, priority=None):
+    """Создаёт строку Task. Если такая же задача уже ждёт в очереди,
+    новая не создаётся: ожидающая получает более позднее из двух run_at
+    и больший приоритет и возвращается."""
+    payload = json.dumps({'args': args, 'kwargs': kwargs}, sort_keys=True)
+    key = hashlib.sha256(f'{spec.name}:{payload}'.encode()).hexdigest()
+    fields = {
+        'name': spec.name,
+        'payload': payload,
+        'priority': spec.priority if priority is None else priority,
+        'max_attempts': spec.max_attempts,
+        'run_at': run_at or timezone.now(),
+    }
+    existing = Task.objects.filter(key=key, status=Task.QUEUED).first()
+    if existing is None:
+        try:
+            with transaction.atomic():
+                return Task.objects.create(key=key, **fields)
+        except IntegrityError:
+            existing = Task.objects.get(key=key, status=Task.QUEUED)
+    return merge(existing, fields)
+
+
+def merge(existing, fields):
+    """Сливает повторную постановку с ожидающей задачей: отложенная
+    заново задача (например, освобождение файла после паузы) не
+    выполнится раньше нового срока."""
+    for field in ('run_at', 'priority'):
+        if fields[field] > getattr(existing, field):
+            Task.objects.filter(
+                pk=existing.pk, **{f'{field}__lt': fields[field]}
+            ).update(**{field: fields[field]})
+            setattr(existing, field, fields[field])
+    return existing
+
+
+def ready(now):
+    """Задачи, которые можно взять: ждущие своего времени и зависшие,
+    у которых истёк таймаут видимости."""
+    return Q(status=Task.QUEUED, run_at__lte=now) | Q(
+        status=Task.RUNNING, locked_until__lt=now)
+
+
+def claim(worker):
+    """Берёт следующую задачу и до batch_size задач с тем же именем.
+
+    UPDATE повторяет условие готовности, поэтому задачу, которую
+    успел взять другой воркер, этот не получит. Попытка считается при
+    взятии: задача, чей воркер умер, не будет браться вечно.
+    """
+    now = timezone.now()
+    first = Task.objects.filter(ready(now)).order_by(
+        '-priority', 'run_at', 'pk').values_list('name', flat=True).first()
+    if first is None:
+        return None, []
+    spec = registry.get(first)
+    size = spec.batch_size if spec else 1
+    ids = list(Task.objects.filter(ready(now), name=first).order_by(
+        '-priority', 'run_at', 'pk').values_list('pk', flat=True)[:size])
+    timeout = timedelta(seconds=settings.TASKS_VISIBILITY_TIMEOUT)
+    Task.objects.filter(ready(now), pk__in=ids).update(
+        status=Task.RUNNING, locked_by=worker, locked_until=now + timeout,
+        attempts=F('attempts') + 1)
+    claimed = list(Task.objects.filter(
+        pk__in=ids, status=Task.RUNNING, locked_by=worker).order_by('pk'))
+    return spec, claimed
+
+
+def backoff(attempts):
+    """Задержка перед повтором: экспонента с разбросом."""
+    delay = settings.TASKS_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def arguments(claimed):
+    return [json.loads(item.payload) for item in claimed]
+
+
+def fail(claimed, error):
+    """Возвращает задачи в очередь с задержкой или, если попытки
+    кончились, помечает их failed."""
+    for item in claimed:
+        item.last_error = error
+        item.locked_by = ''
+        item.locked_until = None
+        if item.attempts >= item.max_attempts:
+            item.status = Task.FAILED
+        else:
+            item.status = Task.QUEUED
+            item.run_at = timezone.now() + backoff(item.attempts)
+        try:
+            # Точка сохранения: ошибка не ломает внешнюю транзакцию.
+            with transaction.atomic():
+                item.save()
+        except IntegrityError:
+            # Пока задача выполнялась, такую же поставили заново.
+            item.delete()
+
+
+def run(spec, claimed):
+    """Выполняет взятые задачи. Успешные удаляются, упавшие уходят
+    в fail."""
+    expired = [item for item in claimed if item.attempts > item.max_attempts]
+    if expired:
+        fail(expired, 'Превышен таймаут видимости')
+        claimed = [item for item in claimed if item not in expired]
+        if not claimed:
+            return False
+    try:
+        if spec is None:
+            raise LookupError(f'Неизвестная задача {claimed[0].name}')
+        payloads = arguments(claimed)
+        if spec.batch_size > 1:
+            spec.func([payload['args'][0] for payload in payloads])
+        else:
+            spec.func(*payloads[0]['args'], **payloads[0]['kwargs'])
+    except Exception:
+        logger.exception('Задача %s упала', claimed[0].name)
+        fail(claimed, traceback.format_exc())
+        return False
+    Task.objects.filter(pk__in=[item.pk for item in claimed]).delete()
+    return True
+
+
+def run_next(worker):
+    """Берёт и выполняет одну партию; False, если очередь пуста."""
+    spec, claimed = claim(worker)
+    if not claimed:
+        return False
+    run(spec, claimed)
+    return True
+
+
+def drain(worker='drain'):
+    """Выполняет всё, что готово сейчас; удобно в тестах и командах."""
+    count = 0
+    while run_next(worker):
+        count += 1
+    return count
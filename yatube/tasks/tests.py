@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Task
+
+calls = []
+
+
+@queue.task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@queue.task(name='tests.urgent', priority=5)
+def urgent(value):
+    calls.append(f'urgent {value}')
+
+
+@queue.task(name='tests.broken', max_attempts=2)
+def broken():
+    raise RuntimeError('сломано')
+
+
+@queue.task(name='tests.requeued')
+def requeued():
+    requeued.delay()
+    raise RuntimeError('сломано')
+
+
+@queue.task(name='tests.batch', batch_size=3)
+def batch(values):
+    calls.append(sorted(values))
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_same_task_deduplicated(self):
+        """Одинаковая задача в очереди одна, с другими аргументами — две."""
+        first = record.delay(1)
+        self.assertEqual(record.delay(1), first)
+        record.delay(2)
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(queue.drain(), 2)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    def test_repeated_delay_merged(self):
+        """Повторная постановка переносит ожидающую задачу на более
+        поздний срок и поднимает приоритет, но не делает её раньше."""
+        later = timezone.now() + timedelta(hours=1)
+        task = record.delay('file')
+        record.delay('file', run_at=later, priority=3)
+        record.delay('file')
+        task.refresh_from_db()
+        self.assertEqual(task.run_at, later)
+        self.assertEqual(task.priority, 3)
+        self.assertEqual(queue.drain(), 0)
+
+    def test_priority_and_run_at(self):
+        """Сначала выполняются задачи с большим приоритетом, задачи из
+        будущего ждут своего времени."""
+        record.delay('later', run_at=timezone.now() + timedelta(hours=1))
+        record.delay('normal')
+        urgent.delay('first')
+        queue.drain()
+        self.assertEqual(calls, ['urgent first', 'normal'])
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+
+    def test_retry_with_backoff_then_fail(self):
+        """Упавшая задача возвращается в очередь с задержкой, после
+        max_attempts помечается failed."""
+        broken.delay()
+        self.assertTrue(queue.run_next('worker'))
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('сломано', task.last_error)
+        self.assertFalse(queue.run_next('worker'))
+        Task.objects.update(run_at=timezone.now())
+        queue.run_next('worker')
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+        self.assertFalse(queue.run_next('worker'))
+
+    @override_settings(TASKS_VISIBILITY_TIMEOUT=60)
+    def test_visibility_timeout(self):
+        """Взятую задачу другой воркер не получит, пока не истечёт
+        таймаут видимости; потом задача выполняется заново."""
+        record.delay('lost')
+        spec, claimed = queue.claim('dead')
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(queue.claim('alive'), (None, []))
+        Task.objects.update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.drain('alive'), 1)
+        self.assertEqual(calls, ['lost'])
+
+    def test_batch(self):
+        """Задачи с batch_size выполняются партиями одним вызовом."""
+        for value in range(5):
+            batch.delay(value)
+        self.assertEqual(queue.drain(), 2)
+        self.assertEqual(calls, [[0, 1, 2], [3, 4]])
+
+    def test_failed_task_requeued_while_running(self):
+        """Если упавшую задачу уже поставили заново, её строка удаляется
+        без поломки транзакции, в которой разбирают очередь."""
+        requeued.delay()
+        with transaction.atomic():
+            self.assertTrue(queue.run_next('worker'))
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertEqual(task.attempts, 0)
+
+    def test_unknown_task_fails(self):
+        """Задача без зарегистрированной функции не теряется молча."""
+        Task.objects.create(name='tests.missing', payload='{}', key='x',
+                            max_attempts=1)
+        queue.drain()
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+
+class QueueTransactionTests(TransactionTestCase):
+    def test_enqueue_rolled_back_with_transaction(self):
+        """Задача, поставленная в откатившейся транзакции, исчезает
+        вместе с ней."""
+        with transaction.atomic():
+            record.delay('rolled back')
+            transaction.set_rollback(True)
+        self.assertFalse(Task.objects.exists())
@@ -37,6 +37,71 @@ ALLOWED_HOSTS = [
 POSTS_PER_PAGE = 10
 FIRST_TEXT_CHARACTERS_POST = 15
 TEST_OF_POST = 13
+TIMELINE_LENGTH = 1000
+# Лента подписок: 'push' — раскладка при записи, 'pull' — чтение при
+# открытии, 'hybrid' — авторов с числом подписчиков больше
+# FEED_PULL_THRESHOLD читаем при открытии, остальных раскладываем.
+# Авторам, которых начали раскладывать (подписчиков стало меньше или
+# сменились настройки), фоновая задача дописывает в ленты прежние посты.
+# После смены FEED_MODE или FEED_PULL_THRESHOLD это запускает migrate
+# или sync_timeline.
+FEED_MODE = 'hybrid'
+FEED_PULL_THRESHOLD = 5000
+TIMELINE_BACKFILL_BATCH_SIZE = 5000
+# Выше порога пагинатор оценивает число постов, а не считает точно.
+PAGINATOR_COUNT_THRESHOLD = 10000
+PAGINATOR_COUNT_TIMEOUT = 60 * 60
+PAGINATOR_WINDOW = 2
+POST_CARD_TIMEOUT = 60 * 60 * 24
+# Поиск по постам (FTS5): веса bm25 для текста, автора и группы,
+# длина фрагмента с подсветкой в словах и размер пачки пересборки.
+SEARCH_WEIGHTS = (10.0, 2.0, 1.0)
+SEARCH_SNIPPET_TOKENS = 24
+SEARCH_REBUILD_BATCH_SIZE = 5000
+# Размеры миниатюр постов: имя -> (геометрия, опции sorl). Создаются
+# задачей из очереди после сохранения поста, шаблоны их только ищут.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_KVSTORE_LRU_SIZE = 10000
+# Варианты картинки поста для srcset: ширины, форматы в порядке
+# предпочтения (недоступные в Pillow пропускаются) и пропорции кадра.
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_FORMATS = ['AVIF', 'WEBP', 'JPEG']
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_MAX_PIXELS = 40_000_000
+# Загрузки пишутся на диск не больше UPLOAD_MAX_BYTES, проверяются по
+# заголовку и перекодируются в отдельном процессе с лимитом памяти.
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedUploadHandler']
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 40_000_000
+UPLOAD_IMAGE_FORMATS = ['JPEG', 'PNG', 'GIF', 'WEBP']
+UPLOAD_REENCODE_MEMORY = 512 * 1024 * 1024
+UPLOAD_REENCODE_TIMEOUT = 30
+# Картинки постов хранятся по хешу содержимого, файл удаляется, когда
+# на него не ссылается ни один пост и его не сохраняли дольше этого.
+MEDIA_RELEASE_GRACE = 60
+# Очередь фоновых задач в БД (приложение tasks, воркер run_tasks).
+TASKS_VISIBILITY_TIMEOUT = 5 * 60
+TASKS_RETRY_BACKOFF = 10
+TASKS_POLL_INTERVAL = 1
+# Картинки постов по запросу: /posts/<id>/image/<хеш>/<ширина>.<формат>.
+# Хеш имени картинки меняется при её замене, поэтому ответ immutable.
+# Варианты лежат в дисковом кеше с вытеснением давно не читавшихся.
+RESIZE_WIDTHS = [320, 480, 640, 960, 1280]
+RESIZE_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP', 'avif': 'AVIF'}
+RESIZE_CACHE_DIR = os.path.join(BASE_DIR, 'resize_cache')
+RESIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RESIZE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Кеш страниц для анонимов: срок свежести, сколько ещё отдавать
+# устаревшую копию, пока один воркер её пересчитывает, и агрессивность
+# раннего пересчёта.
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_CACHE_STALE = 60 * 10
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_BETA = 1.0
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -49,6 +114,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'tasks.apps.TasksConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -59,6 +125,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +137,17 @@ MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Предельное число SQL-запросов на страницу по имени URL.
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 7,
+    'posts:profile': 8,
+    'posts:follow_index': 9,
+    'posts:post_detail': 6,
+}
+# Столько одинаковых запросов за страницу считаются N+1.
+QUERY_N_PLUS_ONE_THRESHOLD = 3
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ] 
@@ -102,16 +181,80 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 с SQLITE_PRAGMAS и режимом транзакций.
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
-
+# Реплики только для чтения: пути к копиям основной базы через запятую
+# в YATUBE_DB_REPLICAS. Копию делает и атомарно подменяет
+# «manage.py backup_db <путь>»; query_only не даёт писать в реплику,
+# а auto_vacuum не задаётся, чтобы соединение не меняло файл копии.
+REPLICA_PATHS = os.environ.get('YATUBE_DB_REPLICAS', '').split(',')
+for number, path in enumerate(filter(None, REPLICA_PATHS), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'OPTIONS': {
+            'transaction_mode': 'DEFERRED',
+            'pragmas': {
+                'auto_vacuum': None,
+                'journal_mode': 'DELETE',
+                'query_only': 1,
+            },
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи браузер читает из основной базы.
+REPLICA_STICKY_SECONDS = 10
+# Выполняются на каждом новом соединении, см. core.backends.sqlite3.
+# WAL пускает читателей параллельно с писателем, busy_timeout (мс)
+# заставляет писателя ждать блокировку вместо «database is locked»,
+# cache_size меньше нуля — в КиБ, temp_store 2 — временные таблицы в
+# памяти. auto_vacuum действует на новых файлах; существующий переводит
+# sqlite_maintenance --enable-incremental.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 2,
+}
+# Таблицы, которые анализирует и показывает в отчёте sqlite_maintenance.
+SQLITE_MAINTENANCE_TABLES = [
+    'posts_post',
+    'posts_comment',
+    'posts_follow',
+    'django_session',
+]
+# backup_db: страниц за шаг backup API, пауза между шагами (с) и
+# сколько раз копирование может начаться заново из-за записи (вне WAL).
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.01
+BACKUP_MAX_RESTARTS = 10
+
+# L1 — LRU в памяти потока (Django 2.2 создаёт объект кеша на поток),
+# L2 — общий SQLite-файл для всех воркеров; чужие изменения доходят
+# до L1 за SYNC_INTERVAL секунд.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'SYNC_INTERVAL': 1,
+        },
     }
 }
+# Тесты подменяют L2 временным файлом, см. core.test_runner.
+TEST_RUNNER = 'core.test_runner.TemporaryCacheRunner'
 
 
 # Password validation